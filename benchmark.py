@@ -0,0 +1,157 @@
+"""
+benchmark.py
+
+Timing benchmarks for the simulator core.
+Run `python benchmark.py` to print throughput under standard and large rule sets.
+"""
+import gc
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from game_rules import GameRules
+from dice_utils import roll_dice
+from score_calculator import ScoreCalculator
+from simulator import Simulator
+from strategy_examples import GreedyStrategy, HumanLikeStrategy, AdvancedHumanLikeStrategy
+
+
+def bench_scoring(rules: GameRules, n: int = 20000) -> float:
+    """
+    Score every category for n random hands
+    :return: hands scored per second
+    """
+    score_calc = ScoreCalculator(rules)
+    hands = [roll_dice(rules.num_dice, rules.num_faces) for _ in range(n)]
+
+    start = time.perf_counter()
+    for dice in hands:
+        score_calc.score_all(dice)
+    elapsed = time.perf_counter() - start
+    return n / elapsed
+
+
+def bench_games(rules: GameRules, strategy, n: int = 500) -> float:
+    """
+    Play n full games with the strategy
+    :return: games per second
+    """
+    sim = Simulator(rules)
+
+    start = time.perf_counter()
+    sim.simulate_many(strategy, n=n)
+    elapsed = time.perf_counter() - start
+    return n / elapsed
+
+
+def bench_fill_scaling(strategy_cls, fills: int = 3, n: int = 300) -> float:
+    """
+    Time per game with max_category_fills=fills relative to standard rules (H3-style sweeps).
+    A fill-independent cost per turn gives a ratio close to fills.
+    """
+    per_game = []
+    for rules in (GameRules(), GameRules(max_category_fills=fills)):
+        # first pass builds the per-rules tables, the second is timed
+        bench_games(rules, strategy_cls(), n=10)
+        per_game.append(1 / bench_games(rules, strategy_cls(), n=n))
+    return per_game[1] / per_game[0]
+
+
+def bench_parallel_modes(rules: GameRules, strategy_name: str = 'HumanLike', cells: int = 16,
+                         games_per_cell: int = 200, workers: int = 4) -> dict[str, float]:
+    """
+    Many small sweep cells (one shard each) run through a thread pool and a process pool
+    :return: mode -> games per second
+    """
+    from parallel_runner import run_games
+
+    rates = {}
+    for mode in ('process', 'thread'):
+        start = time.perf_counter()
+        for cell in range(cells):
+            run_games(rules, strategy_name, games_per_cell, workers=workers, seed=cell,
+                      shard_size=max(games_per_cell // workers, 1), mode=mode)
+        rates[mode] = cells * games_per_cell / (time.perf_counter() - start)
+    return rates
+
+
+def bench_allocations(rules: GameRules, strategy, n: int = 500, reuse_buffers: bool = True) -> tuple[float, float]:
+    """
+    Play n games while tracing memory allocations
+    :return: (games per second, peak traced memory in KiB)
+    """
+    sim = Simulator(rules, reuse_buffers=reuse_buffers)
+    sim.stats.keep_scores = False
+    gc.collect()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    sim.simulate_many(strategy, n=n)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return n / elapsed, peak / 1024
+
+
+def bench_cold_start(modules: str, repeats: int = 5) -> float:
+    """
+    Time a fresh interpreter importing the given modules, minus bare interpreter start-up
+    :param modules: comma separated module names, e.g. "simulator, strategy_examples"
+    :return: median extra milliseconds
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def run(code: str) -> float:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+        return time.perf_counter() - start
+
+    bare = statistics.median(run("pass") for _ in range(repeats))
+    loaded = statistics.median(run(f"import {modules}") for _ in range(repeats))
+    return (loaded - bare) * 1000
+
+
+def main():
+    random.seed(0)
+    rule_sets = {
+        "standard": GameRules(),
+        "20 dice x 20 faces": GameRules(num_dice=20, num_faces=20,
+                                        small_straight_length=8, large_straight_length=12),
+    }
+    strategies = {
+        "Greedy": GreedyStrategy,
+        "HumanLike": HumanLikeStrategy,
+        "AdvancedHumanLike": AdvancedHumanLikeStrategy,
+    }
+
+    print("===== cold start (import cost over bare python) =====")
+    for modules in ("simulator", "simulator, strategy_examples", "strategy_visualization"):
+        print(f"{modules:30s} : {bench_cold_start(modules):7.1f} ms")
+
+    for label, rules in rule_sets.items():
+        print(f"\n===== {label}: {rules} =====")
+        print(f"score_all            : {bench_scoring(rules):10.0f} hands/s")
+        for name, strategy_cls in strategies.items():
+            print(f"{name:20s} : {bench_games(rules, strategy_cls()):10.1f} games/s")
+
+        for reuse in (False, True):
+            rate, peak = bench_allocations(rules, HumanLikeStrategy(), reuse_buffers=reuse)
+            label = "reused buffers" if reuse else "fresh allocations"
+            print(f"HumanLike, {label:17s}: {rate:10.1f} games/s (traced), peak {peak:8.1f} KiB")
+
+    from parallel_runner import gil_enabled
+    print(f"\n===== sweep cells, 4 workers (GIL {'enabled' if gil_enabled() else 'disabled'}) =====")
+    for mode, rate in bench_parallel_modes(GameRules()).items():
+        print(f"{mode:20s} : {rate:10.1f} games/s")
+
+    print("\n===== H3 scaling: time per game with 3 fills / 1 fill (ideal 3.0) =====")
+    for name, strategy_cls in strategies.items():
+        print(f"{name:20s} : {bench_fill_scaling(strategy_cls):10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+category_tables.py
+
+Exact per-turn category tables, built once per GameRules.
+
+For every category and every number of rerolls (0 .. max_rerolls) the tables hold the
+end-of-turn outcome of a turn started from scratch (all dice rolled) while chasing only
+that category, keeping the dice that maximize its expected score on every reroll:
+- hand_distribution: probability of every final sorted hand
+- score_distribution: probability of every final score
+- expected: expected score
+- hit_probability: probability of a non-zero score (for fixed-score categories such as
+  straights, full house and yahtzee: of making the category)
+Queries are dictionary lookups. expected_from answers the same question from a hand in
+the middle of a turn.
+
+Rules with more distinct hands than turn_solver.MAX_SOLVER_HANDS are not supported.
+"""
+from __future__ import annotations
+import threading
+from game_rules import GameRules
+from turn_solver import TurnSolver, get_turn_tables
+from upper_bonus import rules_key
+
+
+class CategoryTables:
+    """
+    End-of-turn distributions per (category, rerolls) under the chase-this-category policy
+    """
+
+    def __init__(self, rules: GameRules):
+        self.rules = rules
+        self.turn_tables = get_turn_tables(rules)
+        self.categories = self.turn_tables.score_calc.get_all_categories()
+
+        # category -> per rerolls: final hand -> probability, final score -> probability
+        self._hands: dict[str, list[dict[tuple, float]]] = {}
+        self._scores: dict[str, list[dict[int, float]]] = {}
+        self._expected: dict[str, list[float]] = {}
+        self._hits: dict[str, list[float]] = {}
+        self._solvers: dict[str, TurnSolver] = {}
+        for cat in self.categories:
+            self._build(cat)
+
+    def _build(self, cat: str) -> None:
+        tables = self.turn_tables
+        solver = TurnSolver(tables, lambda hand: tables.scores(hand)[cat])
+        opening = tables.rolls[tables.num_dice]
+
+        # the chase policy for every hand and rerolls left, shared by every starting reroll count
+        policy: dict[tuple, tuple] = {}
+        for k in range(1, self.rules.max_rerolls + 1):
+            for hand, _ in opening:
+                policy[hand, k] = solver.best_keep(hand, k)[0]
+
+        hands_by_rerolls, scores_by_rerolls, expected, hits = [], [], [], []
+        for rerolls in range(self.rules.max_rerolls + 1):
+            dist = dict(opening)
+            for k in range(rerolls, 0, -1):
+                after: dict[tuple, float] = {}
+                for hand, q in dist.items():
+                    for new_hand, p in tables.outcomes(policy[hand, k]):
+                        after[new_hand] = after.get(new_hand, 0.0) + q * p
+                dist = after
+
+            scores: dict[int, float] = {}
+            for hand, q in dist.items():
+                score = tables.scores(hand)[cat]
+                scores[score] = scores.get(score, 0.0) + q
+            hands_by_rerolls.append(dist)
+            scores_by_rerolls.append(dict(sorted(scores.items())))
+            expected.append(sum(score * q for score, q in scores.items()))
+            hits.append(sum(q for score, q in scores.items() if score > 0))
+
+        self._hands[cat] = hands_by_rerolls
+        self._scores[cat] = scores_by_rerolls
+        self._expected[cat] = expected
+        self._hits[cat] = hits
+        self._solvers[cat] = solver
+
+    def _rerolls(self, rerolls: int | None) -> int:
+        return self.rules.max_rerolls if rerolls is None else rerolls
+
+    def expected(self, category: str, rerolls: int | None = None) -> float:
+        """
+        Expected end-of-turn score of a category chased from scratch
+
+        >>> tables = get_category_tables(GameRules())
+        >>> round(tables.expected('upper_6'), 3), round(tables.expected('chance', 0), 3)
+        (12.639, 17.5)
+        """
+        return self._expected[category][self._rerolls(rerolls)]
+
+    def hit_probability(self, category: str, rerolls: int | None = None) -> float:
+        """
+        Probability of ending the turn with a non-zero score in the category
+
+        >>> tables = get_category_tables(GameRules())
+        >>> round(tables.hit_probability('yahtzee', 0), 5), round(tables.hit_probability('yahtzee'), 4)
+        (0.00077, 0.046)
+        """
+        return self._hits[category][self._rerolls(rerolls)]
+
+    def score_distribution(self, category: str, rerolls: int | None = None) -> dict[int, float]:
+        """
+        Final score -> probability
+        """
+        return self._scores[category][self._rerolls(rerolls)]
+
+    def hand_distribution(self, category: str, rerolls: int | None = None) -> dict[tuple, float]:
+        """
+        Final sorted hand -> probability
+        """
+        return self._hands[category][self._rerolls(rerolls)]
+
+    def expected_from(self, category: str, dice: list[int], rerolls: int) -> float:
+        """
+        Expected end-of-turn score of a category chased from the current dice with `rerolls` rerolls left
+
+        >>> tables = get_category_tables(GameRules())
+        >>> round(tables.expected_from('yahtzee', [6, 6, 6, 6, 1], 1), 3)
+        8.333
+        """
+        return self._solvers[category].hand_value(tuple(sorted(dice)), rerolls)
+
+
+_TABLES: dict[tuple, CategoryTables] = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def get_category_tables(rules: GameRules) -> CategoryTables:
+    """
+    Return the shared tables for these rules, building them on first request
+    """
+    key = rules_key(rules)
+    tables = _TABLES.get(key)
+    if tables is None:
+        with _TABLES_LOCK:
+            tables = _TABLES.get(key)
+            if tables is None:
+                tables = CategoryTables(rules)
+                _TABLES[key] = tables
+    return tables
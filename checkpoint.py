@@ -0,0 +1,58 @@
+"""
+checkpoint.py
+
+Save and restore the progress of long simulate_many runs.
+
+A checkpoint holds the job spec, the number of games completed, the running score total,
+the random generator states and the StatsCollector, so a restarted job continues
+exactly where the last checkpoint left off.
+"""
+from __future__ import annotations
+import os
+import pickle
+from dataclasses import astuple
+from game_rules import GameRules
+
+
+def job_spec(rules: GameRules, strategy, n: int, seed: int | None = None) -> dict:
+    """
+    Identify a simulate_many job, a checkpoint only resumes the job it was written for
+
+    >>> job_spec(GameRules(), object(), 10, seed=1) == job_spec(GameRules(), object(), 10, seed=2)
+    False
+    """
+    strategy_cls = type(strategy)
+    return {
+        'rules': astuple(rules),
+        'strategy': f"{strategy_cls.__module__}.{strategy_cls.__qualname__}",
+        'n': n,
+        'seed': seed,
+    }
+
+
+def save_checkpoint(path: str, payload: dict) -> None:
+    """
+    Write the checkpoint atomically: a crash while writing keeps the previous file intact
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str, spec: dict) -> dict | None:
+    """
+    Load a checkpoint for the given job spec
+    :return: checkpoint payload, or None when there is no checkpoint file
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+
+    if payload.get('spec') != spec:
+        raise ValueError(f"Checkpoint {path} was written for a different job: {payload.get('spec')}")
+    return payload
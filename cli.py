@@ -0,0 +1,145 @@
+"""
+cli.py
+
+Command-line runner: simulate strategies under any rules and print JSON or CSV summaries.
+
+Examples:
+    python cli.py --strategy HumanLike --games 20000 --workers 4 --seed 1
+    python cli.py --faces 10 --fills 3 --strategy Greedy --strategy my_strats.py:MyStrategy --format csv
+    python cli.py --rule large_straight_score=50 --target-se 0.5 --max-games 200000
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import sys
+from dataclasses import fields
+from game_rules import GameRules
+from convergence import print_progress
+from parallel_runner import BUILTIN_STRATEGIES, DEFAULT_SHARD_SIZE, EXECUTION_MODES, run_games, run_to_precision
+
+
+def parse_rules(args) -> GameRules:
+    """
+    Build GameRules from the shortcut options and any --rule KEY=VALUE overrides
+    """
+    values = {
+        'num_dice': args.dice,
+        'num_faces': args.faces,
+        'max_rerolls': args.rerolls,
+        'max_category_fills': args.fills,
+        'upper_bonus_reward': args.bonus_reward,
+    }
+    known = {f.name for f in fields(GameRules)}
+    for item in args.rule:
+        key, sep, value = item.partition('=')
+        if not sep or key not in known:
+            raise SystemExit(f'Invalid --rule {item!r}, expected KEY=VALUE with KEY one of {sorted(known)}')
+        try:
+            values[key] = int(value)
+        except ValueError:
+            raise SystemExit(f'Invalid --rule {item!r}, expected an integer VALUE') from None
+    return GameRules(**{k: v for k, v in values.items() if v is not None})
+
+
+def add_rule_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    The rules options read by parse_rules
+    """
+    rules = parser.add_argument_group('rules (defaults: standard Yahtzee)')
+    rules.add_argument('--dice', type=int, help='number of dice')
+    rules.add_argument('--faces', type=int, help='number of faces per die')
+    rules.add_argument('--rerolls', type=int, help='rerolls per turn')
+    rules.add_argument('--fills', type=int, help='times each category can be filled')
+    rules.add_argument('--bonus-reward', type=int, help='upper section bonus reward')
+    rules.add_argument('--rule', action='append', default=[], metavar='KEY=VALUE',
+                       help='any other GameRules field, e.g. small_straight_score=25')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Monte Carlo Yahtzee strategy simulator')
+    add_rule_arguments(parser)
+
+    run = parser.add_argument_group('run')
+    run.add_argument('--strategy', action='append', default=[],
+                     help=f'strategy to run (repeatable): one of {", ".join(BUILTIN_STRATEGIES)}, '
+                          'module:Class or path/to/file.py:Class (default: all built-ins)')
+    run.add_argument('--games', type=int, default=1000, help='games per strategy')
+    run.add_argument('--target-se', type=float,
+                     help='instead of a fixed game count, run until the mean score standard error is this small')
+    run.add_argument('--max-games', type=int, default=1_000_000, help='game cap with --target-se')
+    run.add_argument('--workers', type=int, default=1, help='parallel workers')
+    run.add_argument('--mode', choices=EXECUTION_MODES, default='auto',
+                     help='worker pool: processes, threads, or auto (threads on free-threaded builds)')
+    run.add_argument('--seed', type=int, help='master seed')
+    run.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='games per work unit')
+
+    out = parser.add_argument_group('output')
+    out.add_argument('--format', choices=('json', 'csv'), default='json')
+    out.add_argument('--output', help='write to this file instead of stdout')
+    out.add_argument('--report', action='store_true', help='also print the human-readable report, with example games, to stderr')
+    out.add_argument('--progress', action='store_true',
+                     help='print throughput, ETA and standard errors to stderr while running')
+    return parser
+
+
+def run(args) -> list[dict]:
+    rules = parse_rules(args)
+    strategies = args.strategy or list(BUILTIN_STRATEGIES)
+
+    rows = []
+    for name in strategies:
+        if args.target_se is not None or args.progress:
+            max_games = args.max_games if args.target_se is not None else args.games
+            stats = run_to_precision(rules, name, args.target_se, max_games, workers=args.workers,
+                                     seed=args.seed, shard_size=args.shard_size, mode=args.mode,
+                                     progress=print_progress if args.progress else None, exemplars=args.report)
+        else:
+            stats = run_games(rules, name, args.games, workers=args.workers, seed=args.seed,
+                              shard_size=args.shard_size, mode=args.mode, exemplars=args.report)
+
+        if args.report:
+            stdout, sys.stdout = sys.stdout, sys.stderr
+            try:
+                print(f"\n##### {name} | {rules}")
+                stats.report()
+            finally:
+                sys.stdout = stdout
+
+        rows.append({'strategy': name, 'rules': str(rules), 'seed': args.seed, **stats.summary()})
+    return rows
+
+
+def write_rows(rows: list[dict], fmt: str, stream) -> None:
+    if fmt == 'json':
+        json.dump(rows, stream, indent=2)
+        stream.write('\n')
+        return
+
+    # CSV: one row per strategy, category usage flattened into usage_<category> columns
+    flat_rows = []
+    for row in rows:
+        flat = {k: v for k, v in row.items() if k != 'category_usage'}
+        for cat, count in row['category_usage'].items():
+            flat[f'usage_{cat}'] = count
+        flat_rows.append(flat)
+    columns = []
+    for flat in flat_rows:
+        columns.extend(k for k in flat if k not in columns)
+    writer = csv.DictWriter(stream, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(flat_rows)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    rows = run(args)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_rows(rows, args.format, f)
+    else:
+        write_rows(rows, args.format, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
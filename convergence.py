@@ -0,0 +1,235 @@
+"""
+convergence.py
+
+Convergence diagnostics and adaptive batch sizing for long Monte Carlo runs.
+
+- BatchMeans: streaming batch-means estimate of the standard error of the mean. Scores are
+  grouped into at most 2 * max_batches batches (adjacent batches are combined when the limit
+  is reached), and the spread of the batch means gives a standard error that stays valid
+  if consecutive games are correlated. For independent games it matches the plain
+  std / sqrt(n); a variance ratio far from 1, or a lag-1 autocorrelation of the batch means
+  far from 0, points at shared random state between games or shards.
+- AdaptiveBatcher: grows the batch size until the fixed per-batch cost (progress reports,
+  stats merges, inter-process traffic) is at most a target fraction of the run time, and
+  a batch lasts at least a minimum time, so cheap strategies such as Random get large
+  batches and expensive ones still report often.
+- Progress: the snapshot handed to progress callbacks after every batch.
+"""
+from __future__ import annotations
+import math
+import sys
+from dataclasses import dataclass
+
+
+class BatchMeans:
+    """
+    Batch-means standard error of a stream of scores or of pre-aggregated batches
+    """
+
+    def __init__(self, max_batches: int = 64, batch_size: int = 1):
+        """
+        :param max_batches: batches kept after combining, memory is at most twice this
+        :param batch_size: initial games per batch when scores are added one at a time
+        """
+        self.max_batches = max_batches
+        self.batch_size = batch_size
+        # closed batches: (games, score sum)
+        self.batches: list[tuple[int, float]] = []
+        self._open_n = 0
+        self._open_sum = 0.0
+        self.n = 0
+        self.total = 0.0
+        self.sq_total = 0.0
+
+    def add(self, score: float) -> None:
+        """
+        Add one game
+        """
+        self.n += 1
+        self.total += score
+        self.sq_total += score * score
+        self._open_n += 1
+        self._open_sum += score
+        if self._open_n >= self.batch_size:
+            self._close(self._open_n, self._open_sum)
+            self._open_n = 0
+            self._open_sum = 0.0
+
+    def add_batch(self, n: int, total: float, sq_total: float) -> None:
+        """
+        Add a batch that was aggregated elsewhere (e.g. one parallel shard)
+        """
+        if n == 0:
+            return
+        self.n += n
+        self.total += total
+        self.sq_total += sq_total
+        self._close(n, total)
+
+    def _close(self, n: int, total: float) -> None:
+        self.batches.append((n, total))
+        if len(self.batches) >= 2 * self.max_batches:
+            pairs = zip(self.batches[::2], self.batches[1::2])
+            self.batches = [(n1 + n2, s1 + s2) for (n1, s1), (n2, s2) in pairs]
+            self.batch_size *= 2
+
+    def mean(self) -> float:
+        return self.total / self.n if self.n else 0.0
+
+    def iid_std_error(self) -> float:
+        """
+        std / sqrt(n), valid when games are independent
+        """
+        if self.n < 2:
+            return float('inf')
+        mean = self.mean()
+        var = max(self.sq_total / self.n - mean * mean, 0.0) * self.n / (self.n - 1)
+        return math.sqrt(var / self.n)
+
+    def std_error(self) -> float:
+        """
+        Standard error of the mean from the spread of the batch means (inf with fewer than 2 batches)
+
+        >>> bm = BatchMeans(batch_size=2)
+        >>> for score in [1, 3, 2, 4, 3, 5]:
+        ...     bm.add(score)
+        >>> round(bm.std_error(), 4), len(bm.batches)
+        (0.5774, 3)
+        """
+        k = len(self.batches)
+        if k < 2:
+            return float('inf')
+        games = sum(n for n, _ in self.batches)
+        mean = sum(total for _, total in self.batches) / games
+        spread = sum(n * (total / n - mean) ** 2 for n, total in self.batches) / (k - 1)
+        return math.sqrt(spread / games)
+
+    def variance_ratio(self) -> float:
+        """
+        (batch-means SE / iid SE) squared: about 1 for independent games, n / ratio is the effective sample size
+        """
+        iid = self.iid_std_error()
+        if not math.isfinite(iid) or iid == 0 or not math.isfinite(self.std_error()):
+            return float('nan')
+        return (self.std_error() / iid) ** 2
+
+    def autocorrelation(self) -> float:
+        """
+        Lag-1 autocorrelation of the batch means, about 0 when batches are independent
+        """
+        means = [total / n for n, total in self.batches]
+        k = len(means)
+        if k < 3:
+            return float('nan')
+        mean = sum(means) / k
+        var = sum((m - mean) ** 2 for m in means)
+        if var == 0:
+            return 0.0
+        return sum((a - mean) * (b - mean) for a, b in zip(means, means[1:])) / var
+
+
+class AdaptiveBatcher:
+    """
+    Batch size that grows until the per-batch overhead is a small fraction of the work
+    """
+
+    def __init__(self, initial: int = 1, target_overhead: float = 0.05, min_seconds: float = 0.0,
+                 max_size: int | None = None, max_growth: float = 4.0):
+        """
+        :param initial: first batch size
+        :param target_overhead: largest acceptable overhead / (work + overhead)
+        :param min_seconds: grow batches whose work takes less than this
+        :param max_size: upper bound of the batch size
+        :param max_growth: largest factor the size grows by in one step
+        """
+        self.size = initial
+        self.target_overhead = target_overhead
+        self.min_seconds = min_seconds
+        self.max_size = max_size
+        self.max_growth = max_growth
+        self.overhead_fraction = 0.0
+
+    def update(self, work_seconds: float, overhead_seconds: float) -> int:
+        """
+        Record the cost of the last batch and return the next batch size. The overhead is
+        taken as fixed per batch and the work as proportional to the batch size.
+
+        >>> batcher = AdaptiveBatcher(initial=10, target_overhead=0.1)
+        >>> batcher.update(work_seconds=1.0, overhead_seconds=0.5)
+        40
+        >>> batcher.update(work_seconds=4.0, overhead_seconds=0.5)
+        45
+        >>> batcher.update(work_seconds=4.5, overhead_seconds=0.5)
+        45
+        """
+        total = work_seconds + overhead_seconds
+        if total <= 0:
+            return self.size
+        self.overhead_fraction = overhead_seconds / total
+        if self.overhead_fraction <= self.target_overhead and work_seconds >= self.min_seconds:
+            return self.size
+
+        target = self.target_overhead
+        if work_seconds > 0:
+            growth = max(overhead_seconds * (1 - target) / (target * work_seconds), self.min_seconds / work_seconds)
+        else:
+            growth = self.max_growth
+        size = math.ceil(self.size * min(growth, self.max_growth))
+        if self.max_size is not None:
+            size = min(size, self.max_size)
+        self.size = max(size, self.size)
+        return self.size
+
+
+@dataclass
+class Progress:
+    """
+    State of a running simulation, passed to progress callbacks after every batch
+    """
+    games: int
+    max_games: int
+    elapsed: float
+    mean: float
+    # plain and batch-means standard errors of the mean score
+    std_error: float
+    batch_std_error: float
+    autocorrelation: float
+    # current games per batch, and the measured per-batch overhead fraction
+    batch_games: int
+    overhead_fraction: float
+    target_se: float | None = None
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def expected_games(self) -> int:
+        """
+        Games the run is expected to play: until the target standard error if one is set, else max_games
+
+        >>> Progress(1000, 10**6, 1.0, 200.0, 1.0, 1.0, 0.0, 100, 0.01, target_se=0.5).expected_games
+        4000
+        """
+        if self.target_se is None or not math.isfinite(self.std_error) or self.games == 0:
+            return self.max_games
+        needed = math.ceil(self.games * (self.std_error / self.target_se) ** 2)
+        return min(max(needed, self.games), self.max_games)
+
+    @property
+    def eta_seconds(self) -> float:
+        rate = self.games_per_second
+        return (self.expected_games - self.games) / rate if rate > 0 else float('inf')
+
+    def __str__(self):
+        return (f"{self.games}/{self.expected_games} games, {self.games_per_second:.0f} games/s, "
+                f"ETA {self.eta_seconds:.0f}s, mean {self.mean:.2f} +- {self.std_error:.3f} "
+                f"(batch means {self.batch_std_error:.3f}, lag-1 r {self.autocorrelation:+.2f}), "
+                f"batch {self.batch_games}, overhead {self.overhead_fraction:.1%}")
+
+
+def print_progress(progress: Progress) -> None:
+    """
+    Progress callback writing one line per batch to stderr
+    """
+    print(progress, file=sys.stderr)
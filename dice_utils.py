@@ -1,8 +1,10 @@
 """
 dice_utils.py
 """
-
+from __future__ import annotations
 import random
+from itertools import combinations_with_replacement
+from math import factorial
 
 
 def roll_dice(n: int = 5, faces: int = 6) -> list[int]:
@@ -31,7 +33,33 @@ def get_indices_to_reroll(dice: list[int], keep_indices: list[int]) -> list[int]
     >>> get_indices_to_reroll([2, 3, 4], [0, 1, 2])
     []
     """
-    return [i for i in range(len(dice)) if i not in keep_indices]
+    keep = set(keep_indices)
+    return [i for i in range(len(dice)) if i not in keep]
+
+
+def keep_mask_from_indices(keep_indices: list[int], num_dice: int) -> int:
+    """
+    Convert a list of indices to keep into a bitmask (bit i set = keep die i), with the same
+    meaning as the list in get_indices_to_reroll and the simulator's list-based path: indices
+    outside range(num_dice) (e.g. negative ones) are ignored, and a list of num_dice entries
+    keeps every die
+
+    >>> keep_mask_from_indices([0, 2], 5)
+    5
+    >>> keep_mask_from_indices([], 5)
+    0
+    >>> keep_mask_from_indices([-1, 1, 7], 5)
+    2
+    >>> keep_mask_from_indices([0, 0, 1, 2, 3], 5)
+    31
+    """
+    if len(keep_indices) == num_dice:
+        return (1 << num_dice) - 1
+    mask = 0
+    for i in keep_indices:
+        if 0 <= i < num_dice:
+            mask |= 1 << i
+    return mask
 
 
 def reroll_indices(dice: list[int], indices_to_roll: list[int], faces: int = 6) -> list[int]:
@@ -61,11 +89,12 @@ def reroll_with_keep(dice: list[int], keep_indices: list[int], faces: int = 6) -
     return reroll_indices(dice, indices_to_reroll, faces = faces)
 
 
-def count_value(dice: list[int], faces: int = 6) -> list[int]:
+def count_value(dice: list[int], faces: int = 6, out: list[int] | None = None) -> list[int]:
     """
     count how many times each face (1 - 6) appears in dice
     :param dice: list of dice values
     :param faces: number of faces on each dice
+    :param out: optional list of length faces to reset and fill instead of allocating a new one
     :return: List[int] counts[0] is count of 1s, ... counts[5] is count of 6s
 
     >>> count_value([4, 4, 6, 1, 3])
@@ -76,13 +105,43 @@ def count_value(dice: list[int], faces: int = 6) -> list[int]:
     [1, 1, 1, 1, 1, 1]
 
     """
-    counts = [0] * faces
+    if out is None:
+        counts = [0] * faces
+    else:
+        counts = out
+        for i in range(faces):
+            counts[i] = 0
     for value in dice:
         if 1 <= value <= faces:
             counts[value - 1] += 1
     return counts
 
 
+def reroll_outcomes(n: int, faces: int = 6) -> list[tuple[tuple[int, ...], float]]:
+    """
+    Every distinct result of rolling n fair dice, as sorted tuples with their exact
+    multinomial probabilities.
+    :param n: number of dice rolled
+    :param faces: number of faces on each dice
+    :return: list of (sorted faces, probability)
+
+    >>> reroll_outcomes(2, 2)
+    [((1, 1), 0.25), ((1, 2), 0.5), ((2, 2), 0.25)]
+    >>> reroll_outcomes(0)
+    [((), 1.0)]
+    >>> round(sum(p for _, p in reroll_outcomes(5)), 12), len(reroll_outcomes(5))
+    (1.0, 252)
+    """
+    total = faces ** n
+    outcomes = []
+    for hand in combinations_with_replacement(range(1, faces + 1), n):
+        ways = factorial(n)
+        for value in set(hand):
+            ways //= factorial(hand.count(value))
+        outcomes.append((hand, ways / total))
+    return outcomes
+
+
 def get_longest_straight(dice: list[int]) -> list[int]:
     """
     Find the longest consecutive sequence of face values in the dice.
@@ -117,5 +176,88 @@ def get_longest_straight(dice: list[int]) -> list[int]:
     return max_seq
 
 
+class DiceRoller:
+    """
+    Dice source used by the simulator.
+
+    Wraps a random generator so a simulator can own its random stream. With antithetic=True
+    every face f drawn from the stream is reported as faces + 1 - f, so two rollers sharing
+    a seed produce mirrored games. With record_openings=True the roller keeps running totals
+    of its opening rolls, used as control variates.
+    """
+
+    def __init__(self, faces: int = 6, rng=None, antithetic: bool = False, record_openings: bool = False):
+        """
+        :param faces: number of faces on each dice
+        :param rng: random.Random instance (default: the shared random module)
+        :param antithetic: mirror every face drawn
+        :param record_openings: keep totals of the opening rolls
+        """
+        self.faces = faces
+        self.rng = rng if rng is not None else random
+        self.antithetic = antithetic
+        self.record_openings = record_openings
+        self.reset_openings()
+
+    def reset_openings(self) -> None:
+        # number of opening rolls, sum of their dice, and how many were already a Yahtzee
+        self.openings = 0
+        self.opening_sum = 0
+        self.opening_yahtzees = 0
+
+    def _face(self) -> int:
+        face = self.rng.randint(1, self.faces)
+        if self.antithetic:
+            return self.faces + 1 - face
+        return face
+
+    def roll(self, n: int = 5) -> list[int]:
+        """
+        Opening roll of n dice
+
+        >>> DiceRoller(6, random.Random(1)).roll(5)
+        [2, 5, 1, 3, 1]
+        >>> DiceRoller(6, random.Random(1), antithetic=True).roll(5)
+        [5, 2, 6, 4, 6]
+        """
+        dice = [self._face() for _ in range(n)]
+        if self.record_openings:
+            self._record_opening(dice)
+        return dice
+
+    def roll_into(self, dice: list[int]) -> None:
+        """
+        Opening roll written in place into an existing dice buffer
+        """
+        for i in range(len(dice)):
+            dice[i] = self._face()
+        if self.record_openings:
+            self._record_opening(dice)
+
+    def _record_opening(self, dice: list[int]) -> None:
+        self.openings += 1
+        self.opening_sum += sum(dice)
+        if min(dice) == max(dice):
+            self.opening_yahtzees += 1
+
+    def reroll_with_keep(self, dice: list[int], keep_indices: list[int]) -> list[int]:
+        """
+        Re-roll all dice except those at keep_indices
+        """
+        new_dice = dice[:]
+        for index in get_indices_to_reroll(dice, keep_indices):
+            new_dice[index] = self._face()
+        return new_dice
 
+    def reroll_mask(self, dice: list[int], keep_mask: int) -> None:
+        """
+        Re-roll in place every die whose bit is not set in keep_mask
 
+        >>> dice = [6, 6, 6, 1, 1]
+        >>> DiceRoller(6, random.Random(1)).reroll_mask(dice, 0b00111)
+        >>> dice[:3]
+        [6, 6, 6]
+        """
+        for i in range(len(dice)):
+            if not keep_mask >> i & 1:
+                dice[i] = self._face()
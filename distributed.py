@@ -0,0 +1,341 @@
+"""
+distributed.py
+
+Run rules x strategy grids on several machines: a coordinator hands out shards over plain TCP
+and workers send back mergeable StatsCollector aggregates.
+
+Protocol, one JSON object per line:
+    worker -> coordinator   {"type": "hello", "worker": "<host>:<pid>"}
+    coordinator -> worker   {"type": "shard", "shard": i, "rules": {...}, "strategy": name,
+                             "games": n, "seed": s}   or   {"type": "done"}
+    worker -> coordinator   {"type": "result", "shard": i, "stats": StatsCollector.to_dict()}
+After each result the coordinator answers on the same connection with the next shard or "done".
+
+A shard held by a worker that disconnects, or does not answer within the lease time, goes back
+to the queue for another worker. Shard seeds come from parallel_runner.shard_seeds in the same
+order as run_games, so each grid cell gives the same aggregates as
+run_games(rules, strategy, n, seed=seed, shard_size=shard_size), whichever workers played it.
+
+Example, all on one machine:
+    python distributed.py coordinator --port 5555 --strategy HumanLike --games 20000 --seed 1 &
+    for i in 1 2 3; do python distributed.py worker --port 5555 & done
+"""
+from __future__ import annotations
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict
+from game_rules import GameRules
+from parallel_runner import BUILTIN_STRATEGIES, DEFAULT_SHARD_SIZE, _shard_sizes, run_shard, shard_seeds
+from stats_collector import StatsCollector
+
+
+DEFAULT_PORT = 5555
+# seconds a worker may spend on one shard before it is given to another worker
+DEFAULT_LEASE = 600.0
+# seconds run_local waits for a whole grid before giving up
+DEFAULT_LOCAL_TIMEOUT = 24 * 3600.0
+# seconds between checks that local workers are still running
+WORKER_POLL = 0.5
+# seconds a worker tries to reconnect to a coordinator that dropped its connection
+RECONNECT_TIMEOUT = 2.0
+
+
+def _send(wfile, message: dict) -> None:
+    wfile.write(json.dumps(message).encode() + b'\n')
+    wfile.flush()
+
+
+def _recv(rfile) -> dict | None:
+    line = rfile.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    One worker connection: send shards one at a time until the grid is done
+    """
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        self.connection.settimeout(coordinator.lease)
+        try:
+            hello = _recv(self.rfile)
+        except (OSError, ValueError):
+            return
+        if not hello or hello.get('type') != 'hello':
+            return
+
+        while True:
+            shard = coordinator.next_shard()
+            if shard is None:
+                try:
+                    _send(self.wfile, {'type': 'done'})
+                except OSError:
+                    pass
+                return
+
+            try:
+                _send(self.wfile, coordinator.messages[shard])
+                reply = _recv(self.rfile)
+            except (OSError, ValueError):
+                reply = None
+            if not reply or reply.get('type') != 'result' or reply.get('shard') != shard:
+                coordinator.requeue(shard)
+                return
+            coordinator.complete(shard, reply['stats'])
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator:
+    """
+    Serves the shards of a grid of (rules, strategy, games) cells to TCP workers
+    """
+
+    def __init__(self, cells: list[tuple[GameRules, str, int]], seed: int | None = None,
+                 shard_size: int = DEFAULT_SHARD_SIZE, host: str = '127.0.0.1', port: int = 0,
+                 lease: float = DEFAULT_LEASE):
+        """
+        :param cells: (rules, strategy name, number of games) per grid cell
+        :param seed: master seed, shared by every cell like repeated run_games calls
+        :param shard_size: games per shard
+        :param host: interface to listen on ('0.0.0.0' for workers on other hosts)
+        :param port: TCP port (0: any free port, see address)
+        :param lease: seconds before an unanswered shard is reassigned
+        """
+        self.cells = list(cells)
+        self.lease = lease
+        # shard id -> grid cell index, and the message sent to workers
+        self.shard_cells: list[int] = []
+        self.messages: list[dict] = []
+        for index, (rules, strategy_name, n) in enumerate(self.cells):
+            fields = asdict(rules)
+            sizes = _shard_sizes(n, shard_size)
+            for size, shard_seed in zip(sizes, shard_seeds(seed, len(sizes))):
+                self.shard_cells.append(index)
+                self.messages.append({'type': 'shard', 'shard': len(self.messages), 'rules': fields,
+                                      'strategy': strategy_name, 'games': size, 'seed': shard_seed})
+
+        self.reassigned = 0
+        self._pending = deque(range(len(self.messages)))
+        self._results: dict[int, dict] = {}
+        self._cond = threading.Condition()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.coordinator = self
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _finished(self) -> bool:
+        return len(self._results) == len(self.messages)
+
+    def next_shard(self) -> int | None:
+        """
+        Block until a shard is free to hand out, or return None once every shard has a result
+        """
+        with self._cond:
+            while not self._pending and not self._finished():
+                self._cond.wait()
+            return self._pending.popleft() if self._pending else None
+
+    def complete(self, shard: int, stats: dict) -> None:
+        with self._cond:
+            # a late answer for a shard that was already reassigned and finished is dropped
+            self._results.setdefault(shard, stats)
+            if shard in self._pending:
+                self._pending.remove(shard)
+            self._cond.notify_all()
+
+    def requeue(self, shard: int) -> None:
+        with self._cond:
+            if shard not in self._results and shard not in self._pending:
+                self._pending.append(shard)
+                self.reassigned += 1
+                self._cond.notify_all()
+
+    def serve(self, timeout: float | None = None, workers_alive=None) -> list[StatsCollector]:
+        """
+        Accept workers until every shard has a result
+        :param timeout: give up after this many seconds (TimeoutError)
+        :param workers_alive: function() -> False once no worker can deliver results any more
+            (e.g. every local worker process has exited), checked every WORKER_POLL seconds
+            (RuntimeError)
+        :return: merged StatsCollector per grid cell, in cell order
+        """
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            with self._cond:
+                while not self._finished():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f'{len(self._results)}/{len(self.messages)} shards done')
+                    if workers_alive is not None:
+                        if not workers_alive():
+                            raise RuntimeError(f'every worker exited with {len(self._results)}/'
+                                               f'{len(self.messages)} shards done')
+                        remaining = WORKER_POLL if remaining is None else min(remaining, WORKER_POLL)
+                    self._cond.wait(remaining)
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+
+        merged = [StatsCollector(rules, keep_scores=False) for rules, _, _ in self.cells]
+        # merge in shard order so the result does not depend on which worker finished first
+        for shard, index in enumerate(self.shard_cells):
+            merged[index].merge(StatsCollector.from_dict(self.cells[index][0], self._results[shard]))
+        return merged
+
+
+def run_worker(host: str = '127.0.0.1', port: int = DEFAULT_PORT, max_shards: int | None = None,
+               connect_timeout: float = 30.0) -> int:
+    """
+    Play shards from a coordinator until it reports the grid done
+    :param host: coordinator host
+    :param port: coordinator port
+    :param max_shards: leave after this many shards (the next one handed out is reassigned)
+    :param connect_timeout: keep retrying the connection this long, so workers may start first
+    :return: number of shards played
+
+    A connection the coordinator drops (e.g. after a shard's lease expired and it was given to
+    another worker) is reopened; the worker leaves once the coordinator no longer answers.
+    """
+    played = 0
+    connected = False
+    while max_shards is None or played < max_shards:
+        try:
+            sock = _connect(host, port, RECONNECT_TIMEOUT if connected else connect_timeout)
+        except OSError:
+            if connected:
+                # the coordinator finished and closed while this worker was busy
+                return played
+            raise
+        connected = True
+
+        with sock, sock.makefile('rb') as rfile, sock.makefile('wb') as wfile:
+            sock.settimeout(None)
+            try:
+                _send(wfile, {'type': 'hello', 'worker': f'{socket.gethostname()}:{os.getpid()}'})
+                while max_shards is None or played < max_shards:
+                    message = _recv(rfile)
+                    if message is None:
+                        # closed without "done": dropped, try again
+                        break
+                    if message['type'] == 'done':
+                        return played
+                    stats = run_shard(message['rules'], message['strategy'], message['games'], message['seed'])
+                    _send(wfile, {'type': 'result', 'shard': message['shard'], 'stats': stats.to_dict()})
+                    played += 1
+            except OSError:
+                # connection dropped, the shard in hand was requeued by the coordinator
+                continue
+    return played
+
+
+def _connect(host: str, port: int, timeout: float) -> socket.socket:
+    # retry until the coordinator listens, for up to timeout seconds
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return socket.create_connection((host, port), timeout=timeout)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def start_local_workers(n: int, host: str, port: int) -> list[subprocess.Popen]:
+    """
+    Start n worker processes on this machine
+    """
+    command = [sys.executable, os.path.abspath(__file__), 'worker', '--host', host, '--port', str(port)]
+    return [subprocess.Popen(command) for _ in range(n)]
+
+
+def run_local(cells: list[tuple[GameRules, str, int]], workers: int = 2, seed: int | None = None,
+              shard_size: int = DEFAULT_SHARD_SIZE, lease: float = DEFAULT_LEASE,
+              timeout: float | None = DEFAULT_LOCAL_TIMEOUT) -> list[StatsCollector]:
+    """
+    Coordinator plus `workers` local worker processes talking over the loopback interface
+    :param timeout: give up after this many seconds (TimeoutError)
+    :return: merged StatsCollector per grid cell
+    :raises RuntimeError: every worker process exited (e.g. crashed) with shards left
+    """
+    coordinator = Coordinator(cells, seed=seed, shard_size=shard_size, lease=lease)
+    host, port = coordinator.address
+    processes = start_local_workers(workers, host, port)
+    try:
+        return coordinator.serve(timeout, workers_alive=lambda: any(p.poll() is None for p in processes))
+    finally:
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    from cli import build_parser, parse_rules, write_rows
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['worker']:
+        parser = argparse.ArgumentParser(prog='distributed.py worker', description='Play shards for a coordinator')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+        parser.add_argument('--max-shards', type=int, help='leave after this many shards')
+        args = parser.parse_args(argv[1:])
+        run_worker(args.host, args.port, max_shards=args.max_shards)
+        return
+    if argv[:1] != ['coordinator']:
+        raise SystemExit('usage: python distributed.py {coordinator,worker} [options]')
+
+    # same rules, strategy and output options as cli.py; --workers starts that many local workers
+    parser = build_parser()
+    parser.prog = 'distributed.py coordinator'
+    parser.set_defaults(workers=0)
+    net = parser.add_argument_group('network')
+    net.add_argument('--host', default='127.0.0.1', help="listen address ('0.0.0.0' for remote workers)")
+    net.add_argument('--port', type=int, default=DEFAULT_PORT)
+    net.add_argument('--lease', type=float, default=DEFAULT_LEASE,
+                     help='seconds before a shard is given to another worker')
+    args = parser.parse_args(argv[1:])
+    if args.target_se is not None:
+        raise SystemExit('--target-se is not supported by the coordinator, use --games')
+
+    rules = parse_rules(args)
+    strategies = args.strategy or list(BUILTIN_STRATEGIES)
+    coordinator = Coordinator([(rules, name, args.games) for name in strategies], seed=args.seed,
+                              shard_size=args.shard_size, host=args.host, port=args.port, lease=args.lease)
+    processes = start_local_workers(args.workers, *coordinator.address)
+    results = coordinator.serve()
+    for process in processes:
+        process.wait()
+    print(f'{len(coordinator.messages)} shards, {coordinator.reassigned} reassigned', file=sys.stderr)
+
+    rows = [{'strategy': name, 'rules': str(rules), 'seed': args.seed, **stats.summary()}
+            for name, stats in zip(strategies, results)]
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_rows(rows, args.format, f)
+    else:
+        write_rows(rows, args.format, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+exemplars.py
+
+Bounded capture of example games: the highest and lowest scoring games plus a uniform
+random sample, each with its turn-by-turn history.
+
+Each buffer keeps the k games with the largest key in a min-heap, so deciding whether a
+game gets in is one comparison with the smallest key kept:
+- top: (score, u)
+- bottom: (-score, u)
+- sample: u
+where u is a uniform random number drawn for every game. Keeping the k largest random keys
+gives a uniform sample without replacement (bottom-k sampling), and u also breaks score
+ties at random. A game is copied into an Exemplar only when a buffer admits it, which
+happens O(k log n) times over n games, so memory stays bounded and typical games cost one
+random number and three comparisons.
+
+Buffers of separate shards merge by keeping the k largest keys of both, which is what one
+buffer would have kept over all the games.
+"""
+from __future__ import annotations
+import heapq
+import random
+from dataclasses import dataclass
+
+
+@dataclass
+class Turn:
+    """
+    One turn of a recorded game
+    """
+    # dice after the opening roll and after every reroll
+    rolls: list[tuple[int, ...]]
+    category: str
+    score: int
+
+    @property
+    def dice(self) -> tuple[int, ...]:
+        """
+        Final dice of the turn
+        """
+        return self.rolls[-1]
+
+
+@dataclass
+class Exemplar:
+    """
+    A captured game
+    """
+    # game number in the run that played it (per shard in parallel runs)
+    index: int
+    total_score: int
+    upper_total: int
+    upper_bonus: int
+    category_scores: dict[str, list[int]]
+    turns: list[Turn]
+
+    @classmethod
+    def from_state(cls, state, index: int, turns: list[tuple] | None = None) -> "Exemplar":
+        """
+        Copy a finished game
+        :param state: GameState at the end of the game
+        :param index: game number
+        :param turns: (rolls, category, score) per turn, as logged by the Simulator
+        """
+        return cls(index=index, total_score=state.total_score, upper_total=state.upper_total,
+                   upper_bonus=state.upper_bonus,
+                   category_scores={cat: scores[:] for cat, scores in state.category_scores.items()},
+                   turns=[Turn(list(rolls), category, score) for rolls, category, score in turns or ()])
+
+    def to_dict(self) -> dict:
+        return {
+            'index': self.index,
+            'total_score': self.total_score,
+            'upper_total': self.upper_total,
+            'upper_bonus': self.upper_bonus,
+            'category_scores': self.category_scores,
+            'turns': [[[list(dice) for dice in turn.rolls], turn.category, turn.score] for turn in self.turns],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Exemplar":
+        return cls(index=data['index'], total_score=data['total_score'], upper_total=data['upper_total'],
+                   upper_bonus=data['upper_bonus'],
+                   category_scores={cat: list(scores) for cat, scores in data['category_scores'].items()},
+                   turns=[Turn([tuple(dice) for dice in rolls], category, score)
+                          for rolls, category, score in data['turns']])
+
+    def describe(self) -> list[str]:
+        """
+        One line per turn: the rolls, the category filled and its score
+        """
+        return [f"  turn {t + 1:2d}: {' -> '.join(''.join(map(str, dice)) for dice in turn.rolls)}"
+                f"  {turn.category} = {turn.score}" for t, turn in enumerate(self.turns)]
+
+
+class ExemplarBuffer:
+    """
+    The top, bottom and randomly sampled games of a run
+    """
+
+    def __init__(self, top: int = 5, bottom: int = 5, sample: int = 20, seed: int | None = None):
+        """
+        :param top: highest scoring games kept
+        :param bottom: lowest scoring games kept
+        :param sample: uniformly sampled games kept
+        :param seed: seed of the sampling keys (default: unseeded)
+        """
+        self.sizes = {'top': top, 'bottom': bottom, 'sample': sample}
+        self.rng = random.Random(seed)
+        self.games = 0
+        # kind -> min-heap of (key, insertion number, exemplar)
+        self._heaps: dict[str, list] = {'top': [], 'bottom': [], 'sample': []}
+        self._pushes = 0
+
+    def _admits(self, kind: str, key) -> bool:
+        heap = self._heaps[kind]
+        k = self.sizes[kind]
+        return len(heap) < k or (k > 0 and key > heap[0][0])
+
+    def _push(self, kind: str, key, exemplar: Exemplar) -> None:
+        heap = self._heaps[kind]
+        self._pushes += 1
+        entry = (key, self._pushes, exemplar)
+        if len(heap) < self.sizes[kind]:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heapreplace(heap, entry)
+
+    def _keys(self, score: int, u: float) -> dict[str, object]:
+        return {'top': (score, u), 'bottom': (-score, u), 'sample': u}
+
+    def offer(self, state, turns: list[tuple] | None = None) -> Exemplar | None:
+        """
+        Consider a finished game, copying it only if a buffer keeps it
+        :param state: GameState at the end of the game
+        :param turns: turn log of the game, see Exemplar.from_state
+        :return: the Exemplar if the game was kept, else None
+        """
+        index = self.games
+        self.games += 1
+        u = self.rng.random()
+        score = state.total_score
+        keys = self._keys(score, u)
+        kinds = [kind for kind, key in keys.items() if self._admits(kind, key)]
+        if not kinds:
+            return None
+
+        exemplar = Exemplar.from_state(state, index, turns)
+        for kind in kinds:
+            self._push(kind, keys[kind], exemplar)
+        return exemplar
+
+    def merge(self, other: "ExemplarBuffer") -> None:
+        """
+        Keep the best entries of both buffers
+        """
+        self.games += other.games
+        for kind, heap in other._heaps.items():
+            for key, _, exemplar in sorted(heap, key=lambda entry: entry[:2]):
+                if self._admits(kind, key):
+                    self._push(kind, key, exemplar)
+
+    def top(self) -> list[Exemplar]:
+        """
+        Highest scoring games, best first
+        """
+        return [entry[2] for entry in sorted(self._heaps['top'], reverse=True, key=lambda entry: entry[:2])]
+
+    def bottom(self) -> list[Exemplar]:
+        """
+        Lowest scoring games, worst first
+        """
+        return [entry[2] for entry in sorted(self._heaps['bottom'], reverse=True, key=lambda entry: entry[:2])]
+
+    def sample(self) -> list[Exemplar]:
+        """
+        Uniform random sample of the games, in no particular order
+        """
+        return [entry[2] for entry in self._heaps['sample']]
+
+    def lowest(self) -> Exemplar | None:
+        games = self.bottom()
+        return games[0] if games else None
+
+    def to_dict(self) -> dict:
+        return {
+            'sizes': self.sizes,
+            'games': self.games,
+            'buffers': {kind: [[key, exemplar.to_dict()] for key, _, exemplar in heap]
+                        for kind, heap in self._heaps.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, seed: int | None = None) -> "ExemplarBuffer":
+        buffer = cls(**data['sizes'], seed=seed)
+        buffer.games = data['games']
+        for kind, entries in data['buffers'].items():
+            for key, exemplar in entries:
+                # JSON turns the (score, u) keys into lists
+                buffer._push(kind, tuple(key) if isinstance(key, list) else key, Exemplar.from_dict(exemplar))
+        return buffer
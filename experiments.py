@@ -0,0 +1,377 @@
+"""
+experiments.py
+
+Declarative experiments for the README hypotheses, run as a cached pipeline.
+
+An Experiment names its rule conditions, strategies, metrics and precision target. Every
+(condition, strategy) cell is simulated with parallel_runner.run_to_precision until the
+standard error of its mean score reaches the target. Finished cells are stored in a
+content-addressed cache: the file name is a hash of everything that determines the result
+(rules, strategy source code, precision target, game cap, seed, shard size), so
+- cells shared by several experiments (e.g. the standard rules in H1, H2 and H3) run once
+- editing one strategy class only reruns that strategy's cells
+- changing the precision target or seed reruns everything it affects
+The source part of the hash covers
+- the strategy class and its base classes
+- the rest of the modules defining them, minus the other strategy classes in those modules
+- every project module these and parallel_runner import, directly or indirectly (simulator,
+  score_calculator, game_state, dice_utils, upper_bonus, turn_solver, category_tables, ...)
+so editing the simulator or a helper reruns the cells it can affect. Modules imported
+inside functions are not followed; bump CACHE_VERSION (or pass force=True) after changing
+those.
+
+Example:
+    python experiments.py H1 H2 H3 --workers 4 --plot
+"""
+from __future__ import annotations
+import hashlib
+import inspect
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass, field, replace
+from game_rules import GameRules
+from parallel_runner import DEFAULT_SHARD_SIZE, EXECUTION_MODES, load_strategy, run_to_precision
+from stats_collector import StatsCollector
+
+
+# part of every cache key, bump it when a change to the simulator alters results
+CACHE_VERSION = 3
+DEFAULT_CACHE_DIRECTORY = 'experiment_cache'
+
+# the README strategies, from least to most elaborate
+README_STRATEGIES = ('Random', 'Greedy', 'SimpleRule', 'HumanLike', 'AdvancedHumanLike')
+
+
+@dataclass
+class Experiment:
+    """
+    A set of (condition, strategy) cells and how precisely to measure them
+    """
+    name: str
+    hypothesis: str
+    # condition label -> rules
+    conditions: dict[str, GameRules]
+    strategies: tuple[str, ...] = README_STRATEGIES
+    # StatsCollector.summary() keys reported per cell
+    metrics: tuple[str, ...] = ('mean', 'std_error', 'bonus_rate', 'yahtzee_rate')
+    # run each cell until the standard error of its mean score is at most this
+    target_se: float = 0.5
+    max_games: int = 200_000
+    seed: int = 0
+    shard_size: int = DEFAULT_SHARD_SIZE
+    # function(ExperimentResult) -> list of finding lines
+    analysis: object = field(default=None, repr=False)
+
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def _source(obj) -> str:
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return getattr(obj, '__qualname__', getattr(obj, '__name__', ''))
+
+
+def _project_imports(module) -> set:
+    """
+    Project modules (files under PROJECT_DIRECTORY) that a module imports at top level
+    """
+    found = set()
+    for value in vars(module).values():
+        imported = value if inspect.ismodule(value) else inspect.getmodule(value)
+        path = getattr(imported, '__file__', None)
+        if imported is not module and path and os.path.dirname(os.path.abspath(path)) == PROJECT_DIRECTORY:
+            found.add(imported)
+    return found
+
+
+def _shared_source(module) -> str:
+    # the module without its strategy classes, whose sources are hashed per strategy
+    source = _source(module)
+    for value in vars(module).values():
+        if (inspect.isclass(value) and value.__module__ == module.__name__
+                and hasattr(value, 'choose_category')):
+            source = source.replace(_source(value), '')
+    return source
+
+
+def strategy_fingerprint(name: str) -> str:
+    """
+    Hash of the source a strategy's results depend on: the strategy class and its base
+    classes, the rest of their modules, and every project module they or the runner import
+
+    Strategies loaded from a file hash like built-in ones:
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'tweak.py')
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write('from strategy_examples import GreedyStrategy\\nclass Tweak(GreedyStrategy):\\n    pass\\n')
+    >>> strategy_fingerprint(f'{path}:Tweak') == strategy_fingerprint(f'{path}:Tweak') != strategy_fingerprint('Greedy')
+    True
+    """
+    classes = [cls for cls in load_strategy(name).__mro__ if cls is not object]
+    strategy_modules = {inspect.getmodule(cls) for cls in classes}
+
+    # project modules reachable from the strategy modules and the runner
+    pending = list(strategy_modules) + [inspect.getmodule(load_strategy)]
+    reached = set(pending)
+    while pending:
+        for imported in _project_imports(pending.pop()):
+            if imported not in reached:
+                reached.add(imported)
+                pending.append(imported)
+
+    digest = hashlib.sha1()
+    for cls in classes:
+        digest.update(_source(cls).encode())
+    for module in sorted(reached, key=lambda m: m.__name__):
+        source = _shared_source(module) if module in strategy_modules else _source(module)
+        digest.update(f'{module.__name__}\n{source}'.encode())
+    return digest.hexdigest()
+
+
+def cell_key(experiment: Experiment, rules: GameRules, strategy: str) -> str:
+    """
+    Content address of one cell's result
+    """
+    spec = {
+        'version': CACHE_VERSION,
+        'rules': asdict(rules),
+        'strategy': strategy,
+        'source': strategy_fingerprint(strategy),
+        'target_se': experiment.target_se,
+        'max_games': experiment.max_games,
+        'seed': experiment.seed,
+        'shard_size': experiment.shard_size,
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+class CellCache:
+    """
+    Finished cells as JSON files named by their key
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY):
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def load(self, key: str, rules: GameRules) -> StatsCollector | None:
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return StatsCollector.from_dict(rules, json.load(f)['stats'])
+
+    def save(self, key: str, strategy: str, rules: GameRules, stats: StatsCollector) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'strategy': strategy, 'rules': asdict(rules), 'stats': stats.to_dict()}, f)
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class ExperimentResult:
+    experiment: Experiment
+    # condition label -> strategy -> stats
+    stats: dict[str, dict[str, StatsCollector]]
+    # cells read from the cache and cells simulated
+    cached: int
+    simulated: int
+    seconds: float
+
+    def value(self, condition: str, strategy: str, metric: str = 'mean') -> float:
+        return self.stats[condition][strategy].summary()[metric]
+
+    def rows(self) -> list[dict]:
+        """
+        One row per cell with the experiment's metrics
+        """
+        rows = []
+        for label, by_strategy in self.stats.items():
+            for strategy, stats in by_strategy.items():
+                summary = stats.summary()
+                rows.append({'experiment': self.experiment.name, 'condition': label, 'strategy': strategy,
+                             'games': summary['games'], **{m: summary[m] for m in self.experiment.metrics}})
+        return rows
+
+    def findings(self) -> list[str]:
+        analysis = self.experiment.analysis
+        return analysis(self) if analysis is not None else []
+
+    def __repr__(self):
+        exp = self.experiment
+        lines = [f"{exp.name}: {exp.hypothesis}",
+                 f"  ({self.cached} cells cached, {self.simulated} simulated, {self.seconds:.1f}s)"]
+        for row in self.rows():
+            values = ', '.join(f"{m}={row[m]:.3f}" for m in exp.metrics)
+            lines.append(f"  {row['condition']:10s} {row['strategy']:20s} games={row['games']:7d} {values}")
+        lines.extend(f"  -> {line}" for line in self.findings())
+        return '\n'.join(lines)
+
+    def plot(self, directory: str = '.') -> list[str]:
+        """
+        Save one comparison figure per condition, as <experiment>_<condition>.png
+        :return: the written paths
+        """
+        import matplotlib.pyplot as plt
+        from stream_plots import draw_comparison
+
+        paths = []
+        for label, by_strategy in self.stats.items():
+            fig = draw_comparison(by_strategy, self.experiment.conditions[label])
+            path = os.path.join(directory, f'{self.experiment.name}_{label}.png')
+            fig.savefig(path)
+            plt.close(fig)
+            paths.append(path)
+        return paths
+
+
+def run_experiment(experiment: Experiment, workers: int = 1, cache: CellCache | None = None,
+                   force: bool = False, mode: str = 'auto', verbose: bool = False) -> ExperimentResult:
+    """
+    Fill every cell of an experiment, from the cache where possible
+    :param experiment: Experiment definition
+    :param workers: parallel workers for the shards of each simulated cell
+    :param cache: CellCache (default: DEFAULT_CACHE_DIRECTORY)
+    :param force: simulate every cell again, replacing cached results
+    :param mode: worker pool mode, see parallel_runner.resolve_mode
+    :param verbose: print each cell as it is filled
+    :return: ExperimentResult
+    """
+    cache = CellCache() if cache is None else cache
+    start = time.perf_counter()
+    cached = simulated = 0
+    results: dict[str, dict[str, StatsCollector]] = {}
+    for label, rules in experiment.conditions.items():
+        results[label] = {}
+        for strategy in experiment.strategies:
+            key = cell_key(experiment, rules, strategy)
+            stats = None if force else cache.load(key, rules)
+            if stats is not None:
+                cached += 1
+            else:
+                stats = run_to_precision(rules, strategy, experiment.target_se, experiment.max_games,
+                                         workers=workers, seed=experiment.seed,
+                                         shard_size=experiment.shard_size, mode=mode)
+                cache.save(key, strategy, rules, stats)
+                simulated += 1
+            if verbose:
+                print(f"{experiment.name} {label} {strategy}: {stats.n_games} games, mean {stats.mean():.2f}")
+            results[label][strategy] = stats
+    return ExperimentResult(experiment, results, cached, simulated, time.perf_counter() - start)
+
+
+def rank_correlation(xs: list[float], ys: list[float]) -> float:
+    """
+    Spearman rank correlation (no ties expected)
+
+    >>> rank_correlation([1, 2, 3], [10, 30, 20])
+    0.5
+    """
+    def ranks(values):
+        order = sorted(range(len(values)), key=values.__getitem__)
+        result = [0] * len(values)
+        for rank, i in enumerate(order):
+            result[i] = rank
+        return result
+
+    n = len(xs)
+    d2 = sum((a - b) ** 2 for a, b in zip(ranks(xs), ranks(ys)))
+    return 1 - 6 * d2 / (n * (n * n - 1))
+
+
+def _complexity_vs_score(result: ExperimentResult) -> list[str]:
+    strategies = result.experiment.strategies
+    lines = []
+    for label in result.stats:
+        means = [result.value(label, s) for s in strategies]
+        rho = rank_correlation(list(range(len(strategies))), means)
+        best = strategies[means.index(max(means))]
+        lines.append(f"{label}: rank correlation of complexity and mean score {rho:+.2f}, best {best}")
+    return lines
+
+
+def _advanced_margin(result: ExperimentResult) -> list[str]:
+    # lead of AdvancedHumanLike over the best other non-random strategy, with its standard error
+    lines = []
+    for label in result.stats:
+        others = [s for s in result.experiment.strategies if s not in ('Random', 'AdvancedHumanLike')]
+        rival = max(others, key=lambda s: result.value(label, s))
+        margin = result.value(label, 'AdvancedHumanLike') - result.value(label, rival)
+        se = math.hypot(result.value(label, 'AdvancedHumanLike', 'std_error'), result.value(label, rival, 'std_error'))
+        lines.append(f"{label}: AdvancedHumanLike - {rival} = {margin:+.2f} +- {se:.2f}")
+    return lines
+
+
+def _relative_spread(result: ExperimentResult) -> list[str]:
+    # gap between the best and worst non-random strategy, as a fraction of the best mean
+    lines = []
+    for label in result.stats:
+        means = [result.value(label, s) for s in result.experiment.strategies if s != 'Random']
+        lines.append(f"{label}: non-random spread {max(means) - min(means):.1f} points "
+                     f"({(max(means) - min(means)) / max(means):.1%} of the best mean)")
+    return lines
+
+
+STANDARD = GameRules()
+
+HYPOTHESES = {
+    'H1': Experiment(
+        name='H1',
+        hypothesis='under standard rules, strategy complexity is positively correlated with average score',
+        conditions={'standard': STANDARD},
+        analysis=_complexity_vs_score,
+    ),
+    'H2': Experiment(
+        name='H2',
+        hypothesis='with more die faces, strategies that assess bonus feasibility lose their advantage',
+        # 12-sided dice, the setting of the README's H2 figure (H2_result.png)
+        conditions={'standard': STANDARD, 'faces12': GameRules(num_faces=12)},
+        analysis=_advanced_margin,
+    ),
+    'H3': Experiment(
+        name='H3',
+        hypothesis='with three fills per category, the advantage of elaborate strategies narrows',
+        conditions={'standard': STANDARD, 'fills3': GameRules(max_category_fills=3)},
+        analysis=_relative_spread,
+    ),
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the README hypothesis experiments')
+    parser.add_argument('experiments', nargs='*', default=list(HYPOTHESES), help=f'any of {", ".join(HYPOTHESES)}')
+    parser.add_argument('--workers', type=int, default=1, help='parallel workers per cell')
+    parser.add_argument('--mode', choices=EXECUTION_MODES, default='auto', help='worker pool: processes, threads or auto')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIRECTORY, help='cache directory')
+    parser.add_argument('--force', action='store_true', help='ignore cached cells')
+    parser.add_argument('--target-se', type=float, help='override the precision target of every experiment')
+    parser.add_argument('--plot', action='store_true', help='save one figure per condition')
+    args = parser.parse_args(argv)
+
+    cache = CellCache(args.cache)
+    for name in args.experiments:
+        if name not in HYPOTHESES:
+            raise SystemExit(f'Unknown experiment {name!r}, expected one of {list(HYPOTHESES)}')
+        experiment = HYPOTHESES[name]
+        if args.target_se is not None:
+            experiment = replace(experiment, target_se=args.target_se)
+        result = run_experiment(experiment, workers=args.workers, cache=cache, force=args.force,
+                                mode=args.mode, verbose=True)
+        print(result)
+        if args.plot:
+            print('  figures: ' + ', '.join(result.plot()))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,18 @@ class GameRules:
     # Upper section bonus reward
     upper_bonus_reward: int = 35
 
+    # Number of matching dice needed for the of-a-kind categories (standard: 3 and 4)
+    three_of_a_kind_size: int = 3
+    four_of_a_kind_size: int = 4
+    # Length of consecutive faces needed for straights (standard: 4 and 5)
+    small_straight_length: int = 4
+    large_straight_length: int = 5
+    # Fixed scores for the pattern categories (standard: 25, 30, 40, 50)
+    full_house_score: int = 25
+    small_straight_score: int = 30
+    large_straight_score: int = 40
+    yahtzee_score: int = 50
+
     # Calculate the threshold to get upper section bonus for different face of dices
     @property
     def upper_bonus_threshold(self) -> int:
@@ -4,7 +4,6 @@ game_state.py
 Manage the state of the Yahtzee game
 """
 from __future__ import annotations
-from copy import deepcopy
 from game_rules import GameRules
 from score_calculator import ScoreCalculator
 
@@ -21,6 +20,14 @@ class GameState:
         self.score_calc = score_calc
         all_cats = self.score_calc.get_all_categories()
         self.category_scores: dict[int, list[int]] = {cat: [] for cat in all_cats}
+        # fills made per category, and the categories that still have a fill left (in category order)
+        self.fill_counts: dict[str, int] = dict.fromkeys(all_cats, 0)
+        self._available: list[str] = list(all_cats)
+        self.total_slots = len(all_cats) * rules.max_category_fills
+
+        # Remaining upper slots, digit f-1 in base (max_category_fills + 1) counts fills left for upper_f
+        self.slot_base = rules.max_category_fills + 1
+        self.upper_slots_code = self.slot_base ** rules.num_faces - 1
 
         # Bonus tracking
         self.upper_total = 0
@@ -28,25 +35,39 @@ class GameState:
         self.lower_total = 0
         # total score
         self.total_score = 0
+        # number of fills made so far
+        self.filled_count = 0
 
+        # scratch dict strategies may reuse for per-decision category scores
+        self.score_buffer: dict[str, int] = {}
 
+    def reset(self) -> None:
+        """
+        Return to the start of a new game in place, reusing the existing containers
+        """
+        for scores in self.category_scores.values():
+            scores.clear()
+        for cat in self.fill_counts:
+            self.fill_counts[cat] = 0
+        self._available[:] = self.fill_counts
+        self.upper_slots_code = self.slot_base ** self.rules.num_faces - 1
+        self.upper_total = 0
+        self.upper_bonus = 0
+        self.lower_total = 0
+        self.total_score = 0
+        self.filled_count = 0
 
     def available_categories(self) -> list[int]:
         """
         Return list of categories not filled
         """
-        return [
-            cat for cat, scores in self.category_scores.items()
-            if len(scores) < self.rules.max_category_fills
-        ]
+        return self._available[:]
+
     def is_complete(self) -> bool:
         """
         Game is complete if all categories are filled
         """
-        for scores in self.category_scores.values():
-            if len(scores) < self.rules.max_category_fills:
-                return False
-        return True
+        return self.filled_count == self.total_slots
 
 
     def copy(self) -> "GameState":
@@ -54,11 +75,15 @@ class GameState:
         Return a deep copy for Monte Carlo Branching
         """
         new_state = GameState(self.rules, self.score_calc)
-        new_state.category_scores = deepcopy(self.category_scores)
+        new_state.category_scores = {cat: scores[:] for cat, scores in self.category_scores.items()}
+        new_state.fill_counts = self.fill_counts.copy()
+        new_state._available = self._available[:]
+        new_state.upper_slots_code = self.upper_slots_code
         new_state.upper_total = self.upper_total
         new_state.upper_bonus = self.upper_bonus
         new_state.lower_total = self.lower_total
         new_state.total_score = self.total_score
+        new_state.filled_count = self.filled_count
 
         return new_state
 
@@ -66,36 +91,47 @@ class GameState:
     # Apply scoring
 
     def update_totals(self):
+        """
+        Recompute every total from category_scores
+        """
         self.upper_total = 0
         self.lower_total = 0
 
+        upper_faces = self.score_calc.upper_faces
         for cat, scores in self.category_scores.items():
             cat_sum = sum(scores)
 
-            if cat.startswith('upper_'):
+            if cat in upper_faces:
                 self.upper_total += cat_sum
             else:
                 self.lower_total += cat_sum
 
+        self.update_bonus()
+
+    def update_bonus(self):
+        """
+        Refresh the upper bonus and total score from the section totals
+        """
         self.upper_bonus = 0
         if self.upper_total >= self.rules.upper_bonus_threshold:
             self.upper_bonus = self.rules.upper_bonus_reward
 
         self.total_score = self.upper_total + self.upper_bonus + self.lower_total
 
-    def apply_category(self, category: str, dice: list[int]) -> None:
+    def apply_category(self, category: str, dice: list[int]) -> int:
         """
         Assign the dice result to a scoring category
         Update upper section totals, bonus, and total game score
+        :return: the score recorded for the category
         """
 
         if category not in self.category_scores:
             raise ValueError(f'Unknown category: {category}')
 
-        current_fills = self.category_scores[category]
+        fills = self.fill_counts[category]
 
         # check if over the maximum fill in times
-        if len(current_fills) >= self.rules.max_category_fills:
+        if fills >= self.rules.max_category_fills:
             raise ValueError(f'Category {category} is full(max {self.rules.max_category_fills})')
 
         # calculate the score
@@ -103,15 +139,26 @@ class GameState:
 
         # record the score
         self.category_scores[category].append(score)
-
-        # update total score
-        self.update_totals()
+        self.filled_count += 1
+        self.fill_counts[category] = fills + 1
+        if fills + 1 == self.rules.max_category_fills:
+            self._available.remove(category)
+
+        # update total score, only the section that changed
+        face = self.score_calc.upper_faces.get(category)
+        if face is not None:
+            self.upper_slots_code -= self.slot_base ** (face - 1)
+            self.upper_total += score
+        else:
+            self.lower_total += score
+        self.update_bonus()
+        return score
 
 
     # Display
     def __repr__(self):
-        filled_count = sum(len(s) for s in self.category_scores.values())
-        total_slots = len(self.category_scores) * self.rules.max_category_fills
+        filled_count = self.filled_count
+        total_slots = self.total_slots
         return (
             f"GameState(upper_total={self.upper_total}, "
             f"upper={self.upper_total}/{self.rules.upper_bonus_threshold}, "
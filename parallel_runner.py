@@ -0,0 +1,342 @@
+"""
+parallel_runner.py
+
+Run simulations in independent shards and merge their StatsCollectors.
+
+A shard is (rules, strategy name, number of games, seed). Shard seeds are derived from one
+master seed, so results depend only on the seed and shard size, not on the worker count.
+
+Shards run in worker processes or, on free-threaded CPython builds (3.13t and later), in a
+thread pool that avoids process startup and pickling. Every shard owns its Simulator, dice
+RNG, strategy instance (with its own rng) and StatsCollector, and ScoreCalculator keeps no
+mutable state, so threads share nothing mutable except the per-rules lookup tables. Those
+are built once under a lock (get_upper_bonus_table, get_turn_tables, get_category_tables);
+UpperBonusTable also fills and drops its lazy rows under a lock, and the remaining lazy
+caches (TurnTables) store values that depend only on their key, so a race at worst
+computes an entry twice. mode='auto' picks threads only when the GIL is disabled.
+"""
+from __future__ import annotations
+import hashlib
+import importlib
+import importlib.util
+import math
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from exemplars import ExemplarBuffer
+from game_rules import GameRules
+from simulator import Simulator
+from stats_collector import StatsCollector
+
+
+# Short names of the built-in strategies in strategy_examples
+BUILTIN_STRATEGIES = {
+    'Random': 'RandomStrategy',
+    'Greedy': 'GreedyStrategy',
+    'SimpleRule': 'SimpleRuleStrategy',
+    'HumanLike': 'HumanLikeStrategy',
+    'AdvancedHumanLike': 'AdvancedHumanLikeStrategy',
+    'Expectimax': 'ExpectimaxStrategy',
+}
+
+DEFAULT_SHARD_SIZE = 1000
+
+EXECUTION_MODES = ('auto', 'process', 'thread')
+
+
+def gil_enabled() -> bool:
+    """
+    False only on a free-threaded build running with the GIL disabled
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def resolve_mode(mode: str) -> str:
+    """
+    Execution mode to use for 'auto', 'process' or 'thread'
+
+    >>> resolve_mode('process')
+    'process'
+    >>> resolve_mode('auto') == ('process' if gil_enabled() else 'thread')
+    True
+    """
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f'Unknown mode {mode!r}, expected one of {EXECUTION_MODES}')
+    if mode == 'auto':
+        return 'process' if gil_enabled() else 'thread'
+    return mode
+
+
+def load_strategy(name: str):
+    """
+    Resolve a strategy name to its class.
+    :param name: a built-in short name ('HumanLike'), a class in strategy_examples
+        ('HumanLikeStrategy'), 'module:ClassName', or 'path/to/file.py:ClassName'
+    :return: strategy class
+
+    A file is executed once per process and registered in sys.modules (see _load_file), so
+    every shard gets the same class object.
+    """
+    if ':' not in name:
+        module = importlib.import_module('strategy_examples')
+        cls_name = BUILTIN_STRATEGIES.get(name, name)
+        if not hasattr(module, cls_name):
+            raise ValueError(f'Unknown strategy: {name}')
+        return getattr(module, cls_name)
+
+    module_name, cls_name = name.rsplit(':', 1)
+    if module_name.endswith('.py'):
+        module = _load_file(module_name)
+    else:
+        module = importlib.import_module(module_name)
+
+    if not hasattr(module, cls_name):
+        raise ValueError(f'Strategy {cls_name} not found in {module_name}')
+    return getattr(module, cls_name)
+
+
+def _load_file(path: str):
+    """
+    Import a strategy file once, under a module name unique to its absolute path
+    """
+    path = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    module_name = f"_strategy_file_{stem}_{hashlib.sha1(path.encode()).hexdigest()[:12]}"
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+def shard_seeds(seed: int | None, n_shards: int, offset: int = 0) -> list[int]:
+    """
+    Independent seeds for shards offset .. offset + n_shards - 1 of a run
+
+    >>> shard_seeds(1, 3) == shard_seeds(1, 5)[:3]
+    True
+    >>> shard_seeds(1, 2, offset=3) == shard_seeds(1, 5)[3:]
+    True
+    """
+    master = random.Random(seed)
+    seeds = [master.getrandbits(63) for _ in range(offset + n_shards)]
+    return seeds[offset:]
+
+
+# random streams of one shard, each seeded separately so that no two draw the same numbers
+SHARD_STREAMS = ('dice', 'strategy', 'global', 'exemplars')
+
+
+def stream_seeds(seed: int | None) -> dict[str, int]:
+    """
+    Independent seeds for the random streams of one shard, derived from the shard seed
+
+    >>> seeds = stream_seeds(1)
+    >>> seeds == stream_seeds(1), len(set(seeds.values())) == len(SHARD_STREAMS)
+    (True, True)
+    """
+    master = random.Random(seed)
+    return {stream: master.getrandbits(64) for stream in SHARD_STREAMS}
+
+
+def run_shard(rules_fields: dict, strategy_name: str, n: int, seed: int,
+              seed_global: bool = True, exemplars: bool = False) -> StatsCollector:
+    """
+    Play one shard of games in the current process
+    :param rules_fields: GameRules fields as a dict (cheap to send to worker processes)
+    :param strategy_name: name accepted by load_strategy
+    :param n: number of games
+    :param seed: shard seed, split into separate seeds for the dice, the strategy's rng,
+        the random module and the exemplar sampling (see stream_seeds)
+    :param seed_global: also seed the shared random module, for strategies drawing from it
+        directly (off in thread mode, where the module is shared by every shard)
+    :param exemplars: capture top, bottom and sampled games with their turns (see exemplars.py)
+    :return: StatsCollector of the shard (per-game lists are not kept)
+    """
+    rules = GameRules(**rules_fields)
+    seeds = stream_seeds(seed)
+    strategy = load_strategy(strategy_name)()
+    strategy.rng = random.Random(seeds['strategy'])
+    if seed_global:
+        random.seed(seeds['global'])
+    sim = Simulator(rules, rng=random.Random(seeds['dice']))
+    sim.stats.keep_scores = False
+    if exemplars:
+        sim.stats.exemplars = ExemplarBuffer(seed=seeds['exemplars'])
+    sim.simulate_many(strategy, n=n)
+    return sim.stats
+
+
+def run_shards(rules_fields: dict, strategy_name: str, sizes: list[int], seeds: list[int],
+               seed_global: bool = True, exemplars: bool = False) -> tuple[list[StatsCollector], float]:
+    """
+    Play several consecutive shards in one worker call
+    :return: the StatsCollector of every shard, and the seconds spent playing them
+    """
+    start = time.perf_counter()
+    stats = [run_shard(rules_fields, strategy_name, size, shard_seed, seed_global, exemplars)
+             for size, shard_seed in zip(sizes, seeds)]
+    return stats, time.perf_counter() - start
+
+
+def _shard_sizes(n: int, shard_size: int) -> list[int]:
+    sizes = [shard_size] * (n // shard_size)
+    if n % shard_size:
+        sizes.append(n % shard_size)
+    return sizes
+
+
+def run_games(rules: GameRules, strategy_name: str, n: int, workers: int = 1, seed: int | None = None,
+              shard_size: int = DEFAULT_SHARD_SIZE, shard_offset: int = 0, mode: str = 'auto',
+              exemplars: bool = False) -> StatsCollector:
+    """
+    Play n games split into shards, in a worker pool when workers > 1
+    :param shard_offset: index of the first shard, so later batches continue the seed sequence
+    :param mode: 'process', 'thread', or 'auto' (threads only when the GIL is disabled)
+    :param exemplars: capture top, bottom and sampled games, merged over the shards
+    :return: merged StatsCollector
+    """
+    sizes = _shard_sizes(n, shard_size)
+    seeds = shard_seeds(seed, len(sizes), offset=shard_offset)
+    fields = asdict(rules)
+
+    merged = StatsCollector(rules, keep_scores=False, exemplars=ExemplarBuffer() if exemplars else None)
+    if workers <= 1:
+        for size, shard_seed in zip(sizes, seeds):
+            merged.merge(run_shard(fields, strategy_name, size, shard_seed, exemplars=exemplars))
+        return merged
+
+    threads = resolve_mode(mode) == 'thread'
+    executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with executor(max_workers=workers) as pool:
+        futures = [pool.submit(run_shard, fields, strategy_name, size, shard_seed, not threads, exemplars)
+                   for size, shard_seed in zip(sizes, seeds)]
+        # merge in shard order so the result does not depend on completion order
+        for future in futures:
+            merged.merge(future.result())
+    return merged
+
+
+def run_to_precision(rules: GameRules, strategy_name: str, target_se: float | None, max_games: int,
+                     workers: int = 1, seed: int | None = None, shard_size: int = DEFAULT_SHARD_SIZE,
+                     mode: str = 'auto', progress=None, target_overhead: float = 0.05,
+                     min_task_seconds: float = 0.5, exemplars: bool = False) -> StatsCollector:
+    """
+    Play shards until the standard error of the mean score is at most target_se or max_games
+    have been played.
+
+    The stopping rule is checked after every shard, in shard order, so the result depends only
+    on the seed and shard size, never on the worker count or timing. Shards are sent to one
+    worker pool in tasks of several shards; the task size grows (convergence.AdaptiveBatcher)
+    until the time workers spend outside the games (start-up, pickling, merging, progress
+    reports) is at most target_overhead of the total.
+    :param target_se: standard error to reach (None: play max_games)
+    :param progress: function(convergence.Progress) called after every task
+    :param target_overhead: largest acceptable fraction of worker time not spent playing
+    :param min_task_seconds: also grow tasks shorter than this, to keep progress reports readable
+    :param exemplars: capture top, bottom and sampled games, merged over the shards
+    :return: merged StatsCollector
+    """
+    from convergence import AdaptiveBatcher, BatchMeans, Progress
+
+    sizes = _shard_sizes(max_games, shard_size)
+    seeds = shard_seeds(seed, len(sizes))
+    fields = asdict(rules)
+    workers = max(workers, 1)
+    threads = resolve_mode(mode) == 'thread'
+
+    merged = StatsCollector(rules, keep_scores=False, exemplars=ExemplarBuffer() if exemplars else None)
+    # every shard is one batch of the batch-means diagnostics
+    batch_means = BatchMeans()
+    # at most a quarter of each worker's share per task, for load balance at the end of the run
+    batcher = AdaptiveBatcher(initial=1, target_overhead=target_overhead, min_seconds=min_task_seconds,
+                              max_size=max(len(sizes) // (4 * workers), 1))
+    start = last = time.perf_counter()
+    # smoothed per-task playing time and worker time lost outside the games
+    work = lost = 0.0
+
+    def tasks():
+        # (sizes, seeds) of the next task, sized by the batcher when it is requested, and no
+        # larger than the workers' share of the shards the target standard error still needs
+        i = 0
+        while i < len(sizes):
+            k = batcher.size
+            n = merged.n_games
+            if target_se is not None and n > 1:
+                needed = math.ceil(n * (merged.summary()['std_error'] / target_se) ** 2 / shard_size)
+                k = max(1, min(k, math.ceil((needed - i) / workers)))
+            yield sizes[i:i + k], seeds[i:i + k]
+            i += k
+
+    def results():
+        if workers == 1:
+            for task_sizes, task_seeds in tasks():
+                yield run_shards(fields, strategy_name, task_sizes, task_seeds, exemplars=exemplars)
+            return
+        executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+        pool = executor(max_workers=workers)
+        try:
+            pending = deque()
+            queued = tasks()
+            for task_sizes, task_seeds in queued:
+                pending.append(pool.submit(run_shards, fields, strategy_name, task_sizes, task_seeds, not threads,
+                                           exemplars))
+                if len(pending) >= 2 * workers:
+                    break
+            # merge in shard order so the result does not depend on completion order
+            while pending:
+                yield pending.popleft().result()
+                for task_sizes, task_seeds in queued:
+                    pending.append(pool.submit(run_shards, fields, strategy_name, task_sizes, task_seeds,
+                                               not threads, exemplars))
+                    break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    done = False
+    tasks_done = 0
+    stream = results()
+    for shard_stats, seconds in stream:
+        tasks_done += 1
+        for stats in shard_stats:
+            merged.merge(stats)
+            batch_means.add_batch(stats.n_games, stats.score_sum, stats.score_sq_sum)
+            if target_se is not None and merged.summary()['std_error'] <= target_se:
+                done = True
+                break
+
+        if progress is not None:
+            summary = merged.summary()
+            progress(Progress(games=merged.n_games, max_games=max_games, elapsed=time.perf_counter() - start,
+                              mean=summary['mean'], std_error=summary['std_error'],
+                              batch_std_error=batch_means.std_error(), autocorrelation=batch_means.autocorrelation(),
+                              batch_games=batcher.size * shard_size, overhead_fraction=batcher.overhead_fraction,
+                              target_se=target_se))
+
+        # worker time since the previous task that was not spent playing: with tasks flowing
+        # steadily, one task finishes every task duration / workers. Results often arrive in
+        # bursts, so the estimate is smoothed over a few tasks.
+        # The first task of each worker also pays for starting the pool, which later tasks do not.
+        now = time.perf_counter()
+        if tasks_done > workers:
+            work = 0.75 * work + 0.25 * seconds
+            lost = 0.75 * lost + 0.25 * ((now - last) * workers - seconds)
+            batcher.update(work, max(lost, 0.0))
+        last = now
+        if done:
+            break
+    stream.close()
+    return merged
@@ -0,0 +1,364 @@
+"""
+policy_table.py
+
+Compile a deterministic strategy into NumPy decision tables and replay it by lookup.
+
+A decision is keyed by (sorted hand, roll index, state signature). The state signature is
+the fill count of every category plus the upper total (capped at the bonus threshold),
+which covers everything the built-in strategies read from GameState.
+Strategies that break ties by dice order (e.g. Counter.most_common) are only
+approximately reproduced; verify_policy reports how often the table disagrees.
+
+Compilation plays sample games with the source strategy. Every state signature reached is
+then enumerated over all possible hands and roll indices (when the number of hands is
+small enough), so replay covers the whole turn, not only the rolls that were sampled.
+
+Tables:
+- keep_table[state, roll_index, hand]: bitmask over the sorted hand (bit j = keep the
+  j-th smallest die), -1 when unknown
+- category_table[state, hand]: index into categories, -1 when unknown
+"""
+from __future__ import annotations
+import random
+from collections import Counter
+from dataclasses import dataclass
+from itertools import combinations_with_replacement
+import numpy as np
+from game_rules import GameRules
+from game_state import GameState
+from simulator import Simulator
+from strategy_examples import Strategy
+
+
+# Enumerate every hand for each reached state when there are at most this many hands
+MAX_ENUMERATED_HANDS = 5000
+
+
+def state_signature(state: GameState) -> tuple:
+    """
+    Compressed state key: fill count per category and the capped upper total
+    """
+    fills = tuple(state.fill_counts.values())
+    return fills, min(state.upper_total, state.rules.upper_bonus_threshold)
+
+
+def sort_hand(dice: list[int]) -> tuple[list[int], tuple[int, ...]]:
+    """
+    :return: (original index of each sorted position, sorted hand)
+
+    >>> sort_hand([5, 2, 5, 1])
+    ([3, 1, 0, 2], (1, 2, 5, 5))
+    """
+    order = sorted(range(len(dice)), key=dice.__getitem__)
+    return order, tuple(dice[i] for i in order)
+
+
+def sorted_keep_mask(hand: tuple[int, ...], kept_values: list[int]) -> int:
+    """
+    Canonical keep mask over a sorted hand, equal dice are kept from the left
+
+    >>> sorted_keep_mask((1, 2, 5, 5), [5, 1])
+    5
+    """
+    remaining = Counter(kept_values)
+    mask = 0
+    for j, value in enumerate(hand):
+        if remaining[value] > 0:
+            remaining[value] -= 1
+            mask |= 1 << j
+    return mask
+
+
+def all_hands(rules: GameRules) -> list[tuple[int, ...]] | None:
+    """
+    Every distinct sorted hand of the rules, or None if there are more than MAX_ENUMERATED_HANDS
+
+    >>> hands = all_hands(GameRules())
+    >>> len(hands), hands[0], hands[-1]
+    (252, (1, 1, 1, 1, 1), (6, 6, 6, 6, 6))
+    """
+    faces = range(1, rules.num_faces + 1)
+    # number of multisets of num_dice faces, stop early once it is clearly too many
+    count = 1
+    for k in range(1, rules.num_dice + 1):
+        count = count * (rules.num_faces + k - 1) // k
+        if count > MAX_ENUMERATED_HANDS:
+            return None
+    return list(combinations_with_replacement(faces, rules.num_dice))
+
+
+class PolicyTable:
+    """
+    Decision tables of a compiled strategy
+    """
+
+    def __init__(self, rules: GameRules, categories: list[str], hands: np.ndarray,
+                 signatures: list[tuple], keep_table: np.ndarray, category_table: np.ndarray):
+        self.rules = rules
+        self.categories = categories
+        self.hands = hands
+        self.signatures = signatures
+        self.keep_table = keep_table
+        self.category_table = category_table
+
+        self.hand_index = {tuple(int(v) for v in hand): i for i, hand in enumerate(hands)}
+        self.state_index = {sig: i for i, sig in enumerate(signatures)}
+
+    @property
+    def nbytes(self) -> int:
+        return self.hands.nbytes + self.keep_table.nbytes + self.category_table.nbytes
+
+    def keep_mask(self, hand: tuple[int, ...], roll_index: int, signature: tuple) -> int:
+        """
+        :return: keep mask over the sorted hand, -1 when the key is not in the table
+        """
+        s = self.state_index.get(signature)
+        h = self.hand_index.get(hand)
+        if s is None or h is None:
+            return -1
+        return int(self.keep_table[s, roll_index, h])
+
+    def category(self, hand: tuple[int, ...], signature: tuple) -> str | None:
+        """
+        :return: category name, None when the key is not in the table
+        """
+        s = self.state_index.get(signature)
+        h = self.hand_index.get(hand)
+        if s is None or h is None:
+            return None
+        idx = int(self.category_table[s, h])
+        return self.categories[idx] if idx >= 0 else None
+
+    def save(self, path: str) -> None:
+        fills = np.array([sig[0] for sig in self.signatures], dtype=np.int16).reshape(len(self.signatures), -1)
+        uppers = np.array([sig[1] for sig in self.signatures], dtype=np.int32)
+        np.savez_compressed(path, hands=self.hands, fills=fills, uppers=uppers,
+                            keep_table=self.keep_table, category_table=self.category_table,
+                            categories=np.array(self.categories))
+
+    @classmethod
+    def load(cls, path: str, rules: GameRules) -> "PolicyTable":
+        data = np.load(path)
+        signatures = [(tuple(int(v) for v in fills), int(upper))
+                      for fills, upper in zip(data['fills'], data['uppers'])]
+        return cls(rules, [str(c) for c in data['categories']], data['hands'], signatures,
+                   data['keep_table'], data['category_table'])
+
+
+class _Recorder(Strategy):
+    """
+    Plays the source strategy and records its decisions for every reached state
+    """
+
+    def __init__(self, source: Strategy, all_hands: list[tuple[int, ...]] | None):
+        self.source = source
+        self.all_hands = all_hands
+        # signature -> {(roll_index, hand): keep mask} and {hand: category}
+        self.keeps: dict[tuple, dict] = {}
+        self.choices: dict[tuple, dict] = {}
+
+    def _record_keep(self, sig, hand, roll_index, state):
+        keep = self.source.choose_dice_to_keep(list(hand), roll_index, state)
+        self.keeps[sig][(roll_index, hand)] = sorted_keep_mask(hand, [hand[i] for i in keep])
+
+    def _record_category(self, sig, hand, state):
+        self.choices[sig][hand] = self.source.choose_category(list(hand), state)
+
+    def _visit(self, state: GameState) -> tuple:
+        sig = state_signature(state)
+        if sig not in self.keeps:
+            self.keeps[sig] = {}
+            self.choices[sig] = {}
+            if self.all_hands is not None:
+                for hand in self.all_hands:
+                    for roll_index in range(state.rules.max_rerolls):
+                        self._record_keep(sig, hand, roll_index, state)
+                    self._record_category(sig, hand, state)
+        return sig
+
+    def choose_dice_to_keep(self, dice, roll_index, state):
+        sig = self._visit(state)
+        _, hand = sort_hand(dice)
+        if (roll_index, hand) not in self.keeps[sig]:
+            self._record_keep(sig, hand, roll_index, state)
+        return self.source.choose_dice_to_keep(dice, roll_index, state)
+
+    def choose_category(self, dice, state):
+        sig = self._visit(state)
+        _, hand = sort_hand(dice)
+        if hand not in self.choices[sig]:
+            self._record_category(sig, hand, state)
+        return self.source.choose_category(dice, state)
+
+
+def compile_policy(strategy: Strategy, rules: GameRules, n_games: int = 200,
+                   seed: int | None = None) -> PolicyTable:
+    """
+    Compile a deterministic strategy into decision tables
+    :param strategy: source strategy, its decisions must depend only on dice, roll index and state
+    :param rules: GameRules object
+    :param n_games: number of sample games used to discover reachable states
+    :param seed: seed for the sample games
+    :return: PolicyTable
+    """
+    known_hands = all_hands(rules)
+    recorder = _Recorder(strategy, known_hands)
+    sim = Simulator(rules, rng=random.Random(seed))
+    sim.stats.keep_scores = False
+    sim.simulate_many(recorder, n=n_games)
+
+    categories = sim.score_calc.get_all_categories()
+    cat_index = {cat: i for i, cat in enumerate(categories)}
+
+    if known_hands is None:
+        seen = set()
+        for per_state in recorder.choices.values():
+            seen.update(per_state)
+        for per_state in recorder.keeps.values():
+            seen.update(hand for _, hand in per_state)
+        known_hands = sorted(seen)
+    hand_index = {hand: i for i, hand in enumerate(known_hands)}
+
+    signatures = list(recorder.keeps)
+    n_states, n_hands = len(signatures), len(known_hands)
+    keep_dtype = np.int8 if rules.num_dice < 8 else np.int16 if rules.num_dice < 16 else np.int32
+    cat_dtype = np.int8 if len(categories) < 128 else np.int16
+
+    keep_table = np.full((n_states, rules.max_rerolls, n_hands), -1, dtype=keep_dtype)
+    category_table = np.full((n_states, n_hands), -1, dtype=cat_dtype)
+    for s, sig in enumerate(signatures):
+        for (roll_index, hand), mask in recorder.keeps[sig].items():
+            keep_table[s, roll_index, hand_index[hand]] = mask
+        for hand, cat in recorder.choices[sig].items():
+            category_table[s, hand_index[hand]] = cat_index[cat]
+
+    hands = np.array(known_hands, dtype=np.uint16).reshape(n_hands, rules.num_dice)
+    return PolicyTable(rules, categories, hands, signatures, keep_table, category_table)
+
+
+class TableStrategy(Strategy):
+    """
+    Replays a compiled PolicyTable. Keys missing from the table go to the fallback
+    strategy, or raise KeyError when there is none.
+    """
+
+    def __init__(self, table: PolicyTable, fallback: Strategy | None = None):
+        self.table = table
+        self.fallback = fallback
+        self.misses = 0
+
+        # the state only changes between turns, so its table rows are looked up once per turn
+        self._state = None
+        self._filled = -1
+        self._rows = None
+        # state index -> (keep rows, category row) as Python lists, converted on first use
+        self._row_cache: dict[int, tuple[list, list]] = {}
+
+    def _state_rows(self, state: GameState):
+        if state is self._state and state.filled_count == self._filled:
+            return self._rows
+
+        s = self.table.state_index.get(state_signature(state))
+        rows = None
+        if s is not None:
+            rows = self._row_cache.get(s)
+            if rows is None:
+                rows = (self.table.keep_table[s].tolist(), self.table.category_table[s].tolist())
+                self._row_cache[s] = rows
+
+        self._state, self._filled, self._rows = state, state.filled_count, rows
+        return rows
+
+    def _miss(self, key):
+        self.misses += 1
+        if self.fallback is None:
+            raise KeyError(f'Decision not in policy table: {key}')
+
+    def choose_dice_to_keep(self, dice: list[int], roll_index: int, state: GameState) -> list[int]:
+        order, hand = sort_hand(dice)
+        rows = self._state_rows(state)
+        h = self.table.hand_index.get(hand)
+        mask = rows[0][roll_index][h] if rows is not None and h is not None else -1
+        if mask < 0:
+            self._miss((hand, roll_index, state_signature(state)))
+            return self.fallback.choose_dice_to_keep(dice, roll_index, state)
+        return [order[j] for j in range(len(order)) if mask >> j & 1]
+
+    def choose_category(self, dice: list[int], state: GameState) -> str:
+        hand = tuple(sorted(dice))
+        rows = self._state_rows(state)
+        h = self.table.hand_index.get(hand)
+        idx = rows[1][h] if rows is not None and h is not None else -1
+        if idx < 0:
+            self._miss((hand, state_signature(state)))
+            return self.fallback.choose_category(dice, state)
+        return self.table.categories[idx]
+
+
+@dataclass
+class VerificationReport:
+    """
+    Agreement between a compiled table and its source strategy
+    """
+    decisions: int
+    misses: int
+    mismatches: int
+
+    @property
+    def agreement(self) -> float:
+        """
+        Fraction of table hits that matched the source strategy
+        """
+        hits = self.decisions - self.misses
+        return (hits - self.mismatches) / hits if hits else 0.0
+
+    def __repr__(self):
+        return (f"VerificationReport(decisions={self.decisions}, misses={self.misses}, "
+                f"mismatches={self.mismatches}, agreement={self.agreement * 100:.2f}%)")
+
+
+class _Checker(Strategy):
+    """
+    Plays the source strategy while comparing every decision with the table
+    """
+
+    def __init__(self, source: Strategy, table: PolicyTable):
+        self.source = source
+        self.table = table
+        self.decisions = 0
+        self.misses = 0
+        self.mismatches = 0
+
+    def choose_dice_to_keep(self, dice, roll_index, state):
+        keep = self.source.choose_dice_to_keep(dice, roll_index, state)
+        _, hand = sort_hand(dice)
+        mask = self.table.keep_mask(hand, roll_index, state_signature(state))
+        self.decisions += 1
+        if mask < 0:
+            self.misses += 1
+        elif mask != sorted_keep_mask(hand, [dice[i] for i in keep]):
+            self.mismatches += 1
+        return keep
+
+    def choose_category(self, dice, state):
+        cat = self.source.choose_category(dice, state)
+        _, hand = sort_hand(dice)
+        table_cat = self.table.category(hand, state_signature(state))
+        self.decisions += 1
+        if table_cat is None:
+            self.misses += 1
+        elif table_cat != cat:
+            self.mismatches += 1
+        return cat
+
+
+def verify_policy(table: PolicyTable, strategy: Strategy, n_games: int = 200,
+                  seed: int | None = None) -> VerificationReport:
+    """
+    Play fresh games with the source strategy and check every decision against the table
+    """
+    checker = _Checker(strategy, table)
+    sim = Simulator(table.rules, rng=random.Random(seed))
+    sim.stats.keep_scores = False
+    sim.simulate_many(checker, n=n_games)
+    return VerificationReport(checker.decisions, checker.misses, checker.mismatches)
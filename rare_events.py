@@ -0,0 +1,340 @@
+"""
+rare_events.py
+
+Estimates of rare game outcomes (very high or very low final scores, multiple Yahtzees,
+other category hits) that are far cheaper than plain Monte Carlo.
+
+Importance sampling (estimate_tail): games are played with biased dice and every game is reweighted by its likelihood ratio
+P(dice under fair dice) / P(dice under biased dice), so the estimates stay unbiased.
+Two biases are available:
+- tilt: exponential tilting of the face values, q(f) ~ exp(tilt * f / faces).
+  Positive tilt favours high faces (high scores), negative tilt favours low faces.
+- stickiness: on rerolls, each die lands on the most common kept face with extra
+  probability `stickiness`, which makes of-a-kind outcomes (Yahtzees) far more frequent.
+A game rolls well over a hundred dice, so keep the bias small (|tilt| <= 0.3,
+stickiness <= 0.1) or the weights degenerate; weight_ess shows how healthy they are.
+
+Multilevel splitting (estimate_score_tail_splitting): for final-score tails, a game whose
+projected final score moves closer to the threshold is cloned at the turn boundary, each
+clone carrying a share of its weight. Dice stay fair, so the estimate is unbiased for any
+choice of levels.
+"""
+from __future__ import annotations
+import math
+import random
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import dataclass
+from dice_utils import DiceRoller
+from game_state import GameState
+from simulator import Simulator
+
+
+class TiltedDiceRoller(DiceRoller):
+    """
+    DiceRoller drawing from a biased distribution and tracking the log likelihood ratio
+    """
+
+    def __init__(self, faces: int = 6, rng=None, tilt: float = 0.0, stickiness: float = 0.0):
+        """
+        :param faces: number of faces on each dice
+        :param rng: random.Random instance (default: the shared random module)
+        :param tilt: exponential tilt toward high (> 0) or low (< 0) faces
+        :param stickiness: extra probability for a rerolled die to match the most common kept face
+        """
+        super().__init__(faces, rng)
+        if not 0.0 <= stickiness < 1.0:
+            raise ValueError(f'stickiness must be in [0, 1): {stickiness}')
+        self.tilt = tilt
+        self.stickiness = stickiness
+
+        weights = [math.exp(tilt * f / faces) for f in range(1, faces + 1)]
+        total = sum(weights)
+        self.base_q = [w / total for w in weights]
+        self.cumulative = []
+        acc = 0.0
+        for q in self.base_q:
+            acc += q
+            self.cumulative.append(acc)
+        # log(p / q) of every face without stickiness
+        self.log_ratio = [-math.log(faces * q) for q in self.base_q]
+
+        self.log_weight = 0.0
+        self._target = 0
+
+    def reset_weight(self) -> None:
+        self.log_weight = 0.0
+
+    @property
+    def weight(self) -> float:
+        return math.exp(self.log_weight)
+
+    def _base_face(self, u: float) -> int:
+        return min(bisect_right(self.cumulative, u), self.faces - 1) + 1
+
+    def _face(self) -> int:
+        u = self.rng.random()
+        s = self.stickiness if self._target else 0.0
+        if not s:
+            face = self._base_face(u)
+            self.log_weight += self.log_ratio[face - 1]
+            return face
+
+        if u < s:
+            face = self._target
+        else:
+            face = self._base_face((u - s) / (1 - s))
+        q = (1 - s) * self.base_q[face - 1] + (s if face == self._target else 0.0)
+        self.log_weight -= math.log(self.faces * q)
+        return face
+
+    def _set_target(self, kept: list[int]) -> None:
+        if kept and self.stickiness:
+            counts = Counter(kept)
+            # most common kept face, ties go to the higher face
+            self._target = max(counts, key=lambda f: (counts[f], f))
+        else:
+            self._target = 0
+
+    def reroll_with_keep(self, dice: list[int], keep_indices: list[int]) -> list[int]:
+        self._set_target([dice[i] for i in set(keep_indices)])
+        try:
+            return super().reroll_with_keep(dice, keep_indices)
+        finally:
+            self._target = 0
+
+    def reroll_mask(self, dice: list[int], keep_mask: int) -> None:
+        self._set_target([d for i, d in enumerate(dice) if keep_mask >> i & 1])
+        try:
+            super().reroll_mask(dice, keep_mask)
+        finally:
+            self._target = 0
+
+
+# Event builders: each returns a predicate on a finished GameState
+
+def score_at_least(threshold: int):
+    return lambda state: state.total_score >= threshold
+
+
+def score_at_most(threshold: int):
+    return lambda state: state.total_score <= threshold
+
+
+def category_hits_at_least(category: str, hits: int = 1):
+    """
+    The category was filled with a non-zero score at least `hits` times
+    """
+    return lambda state: sum(1 for s in state.category_scores[category] if s > 0) >= hits
+
+
+@dataclass
+class TailEstimate:
+    """
+    Weighted (importance sampling or splitting) estimate of one event probability
+    """
+    probability: float
+    std_error: float
+    n_games: int
+    # simulated games (biased or cloned) in which the event happened
+    hits: int
+    # effective sample size of the weights, sum(w)^2 / sum(w^2)
+    weight_ess: float
+    # simulation work spent, in full games
+    cost_games: float
+
+    @property
+    def ci95(self) -> tuple[float, float]:
+        half = 1.96 * self.std_error
+        return max(self.probability - half, 0.0), self.probability + half
+
+    @property
+    def speedup(self) -> float:
+        """
+        Work plain Monte Carlo would need for the same standard error, relative to the work spent
+        """
+        p = self.probability
+        if self.std_error == 0 or p <= 0:
+            return 0.0
+        return p * (1 - p) / (self.cost_games * self.std_error ** 2)
+
+    def __repr__(self):
+        low, high = self.ci95
+        return (f"TailEstimate(p={self.probability:.3e}, 95% CI=[{low:.3e}, {high:.3e}], "
+                f"hits={self.hits}/{self.n_games}, speedup={self.speedup:.1f}x)")
+
+
+def estimate_tail(sim, strategy, events: dict, n: int = 10000, tilt: float = 0.0,
+                  stickiness: float = 0.0, seed: int | None = None) -> dict[str, TailEstimate]:
+    """
+    Estimate event probabilities with biased dice and likelihood-ratio weights.
+    The games are not recorded in sim.stats.
+    :param sim: Simulator providing the rules and score calculator
+    :param strategy: chosen strategy
+    :param events: event name -> predicate on the finished GameState
+    :param n: number of games to simulate
+    :param tilt: exponential face tilt of the biased dice
+    :param stickiness: extra probability of rerolled dice matching the kept face
+    :param seed: seed for the biased dice
+    :return: event name -> TailEstimate
+    """
+    roller = TiltedDiceRoller(sim.rules.num_faces, random.Random(seed), tilt=tilt, stickiness=stickiness)
+    private = _scratch_simulator(sim, roller)
+
+    sums = {name: 0.0 for name in events}
+    sq_sums = {name: 0.0 for name in events}
+    hits = {name: 0 for name in events}
+    w_sum = 0.0
+    w_sq_sum = 0.0
+    for _ in range(n):
+        roller.reset_weight()
+        state = _play_out(private, strategy)
+
+        w = roller.weight
+        w_sum += w
+        w_sq_sum += w * w
+        for name, predicate in events.items():
+            if predicate(state):
+                hits[name] += 1
+                sums[name] += w
+                sq_sums[name] += w * w
+
+    weight_ess = w_sum * w_sum / w_sq_sum if w_sq_sum else 0.0
+    results = {}
+    for name in events:
+        p = sums[name] / n
+        var = max(sq_sums[name] / n - p * p, 0.0) * n / (n - 1) if n > 1 else 0.0
+        results[name] = TailEstimate(probability=p, std_error=math.sqrt(var / n), n_games=n,
+                                     hits=hits[name], weight_ess=weight_ess, cost_games=n)
+    return results
+
+
+def _scratch_simulator(sim, roller: DiceRoller | None = None) -> Simulator:
+    """
+    Simulator sharing the rules, score calculator and dice of sim (or the given roller), with
+    its own StatsCollector, so the games played here never reach sim.stats
+    """
+    private = Simulator(sim.rules, reuse_buffers=sim.reuse_buffers)
+    private.score_calc = sim.score_calc
+    private.roller = sim.roller if roller is None else roller
+    private.stats.keep_scores = False
+    return private
+
+
+def _play_out(sim, strategy) -> GameState:
+    state = GameState(sim.rules, sim.score_calc)
+    while not state.is_complete():
+        sim.simulate_turn(state, strategy)
+    return state
+
+
+def category_pars(sim, strategy, n_pilot: int = 200) -> tuple[dict[str, float], float]:
+    """
+    Average score per fill of every category, and the average final score, from pilot games
+    (not recorded in sim.stats)
+    """
+    sim = _scratch_simulator(sim)
+    sums = {cat: 0 for cat in sim.score_calc.get_all_categories()}
+    final_sum = 0
+    for _ in range(n_pilot):
+        state = _play_out(sim, strategy)
+        final_sum += state.total_score
+        for cat, scores in state.category_scores.items():
+            sums[cat] += sum(scores)
+    fills = n_pilot * sim.rules.max_category_fills
+    return {cat: total / fills for cat, total in sums.items()}, final_sum / n_pilot
+
+
+def estimate_score_tail_splitting(sim, strategy, threshold: int, n: int = 1000, upper: bool = True,
+                                  split: int = 2, levels: int = 6, n_pilot: int = 200) -> TailEstimate:
+    """
+    Estimate P(final score >= threshold) (or <= threshold with upper=False) by multilevel splitting.
+
+    Progress is measured by the projected final score: the current total plus the pilot
+    average of every open slot. Levels are spaced evenly between the pilot average final
+    score and the threshold. The games are not recorded in sim.stats.
+    :param sim: Simulator providing the rules, dice and score calculator
+    :param strategy: chosen strategy
+    :param threshold: final score threshold
+    :param n: number of independent root games
+    :param upper: estimate the upper tail (True) or the lower tail (False)
+    :param split: copies made each time a game reaches a new level
+    :param levels: number of levels between the average and the threshold
+    :param n_pilot: pilot games used to measure the category averages
+    :return: TailEstimate
+
+    >>> from game_rules import GameRules
+    >>> from strategy_examples import GreedyStrategy
+    >>> sim = Simulator(GameRules(), rng=random.Random(1))
+    >>> _ = estimate_tail(sim, GreedyStrategy(), {'high': lambda state: state.total_score >= 250}, n=20, seed=1)
+    >>> _ = estimate_score_tail_splitting(sim, GreedyStrategy(), 250, n=5, n_pilot=20)
+    >>> sim.stats.n_games, sum(sim.stats.category_usage.values()), sim.stats.yahtzee_hits
+    (0, 0, 0)
+    """
+    pars, mean_final = category_pars(sim, strategy, n_pilot)
+    sim = _scratch_simulator(sim)
+    max_fills = sim.rules.max_category_fills
+    total_slots = len(pars) * max_fills
+    step = max(abs(threshold - mean_final) / levels, 1e-9)
+    sign = 1 if upper else -1
+
+    def level_of(state: GameState) -> int:
+        projected = state.total_score
+        for cat, fills in state.fill_counts.items():
+            projected += (max_fills - fills) * pars[cat]
+        ahead = sign * (projected - mean_final)
+        return min(max(int(ahead // step), 0), levels)
+
+    def hit(state: GameState) -> bool:
+        return state.total_score >= threshold if upper else state.total_score <= threshold
+
+    root_values = []
+    hits = 0
+    w_sum = 0.0
+    w_sq_sum = 0.0
+    turns = n_pilot * total_slots
+    for _ in range(n):
+        root_value = 0.0
+        stack = [(GameState(sim.rules, sim.score_calc), 1.0, 0)]
+        while stack:
+            state, w, level = stack.pop()
+            while not state.is_complete():
+                sim.simulate_turn(state, strategy)
+                turns += 1
+                new_level = level_of(state)
+                if new_level > level:
+                    copies = split ** (new_level - level)
+                    w /= copies
+                    for _ in range(copies - 1):
+                        stack.append((state.copy(), w, new_level))
+                    level = new_level
+            if hit(state):
+                hits += 1
+                root_value += w
+                w_sum += w
+                w_sq_sum += w * w
+        root_values.append(root_value)
+
+    p = sum(root_values) / n
+    var = sum((v - p) ** 2 for v in root_values) / (n - 1) if n > 1 else 0.0
+    weight_ess = w_sum * w_sum / w_sq_sum if w_sq_sum else 0.0
+    return TailEstimate(probability=p, std_error=math.sqrt(var / n), n_games=n, hits=hits,
+                        weight_ess=weight_ess, cost_games=turns / total_slots)
+
+
+def choose_bias(sim, strategy, event, candidates: list[tuple[float, float]],
+                n_pilot: int = 500, seed: int | None = None) -> tuple[float, float]:
+    """
+    Pick the (tilt, stickiness) pair with the lowest relative error on short pilot runs
+    """
+    best = candidates[0]
+    best_rel = float('inf')
+    for i, (tilt, stickiness) in enumerate(candidates):
+        pilot_seed = None if seed is None else seed + i
+        est = estimate_tail(sim, strategy, {'event': event}, n=n_pilot, tilt=tilt,
+                            stickiness=stickiness, seed=pilot_seed)['event']
+        if est.probability > 0:
+            rel = est.std_error / est.probability
+            if rel < best_rel:
+                best, best_rel = (tilt, stickiness), rel
+    return best
@@ -0,0 +1,264 @@
+"""
+regression.py
+
+Detect whether a changed strategy scores better or worse than a stored baseline.
+
+A baseline is the list of final scores of one strategy under one GameRules, game i played
+from a fixed per-game seed. A candidate replays the same games: the dice are reseeded at
+the start of every turn from the game seed (common random numbers), so both versions see
+the same rolls until their keep decisions differ. The paired score differences have a far
+smaller variance than two independent runs.
+
+The candidate is played in batches and tested sequentially with an always-valid
+confidence sequence (normal mixture, mixing scale = tolerance) for the mean difference,
+so checking after every batch does not inflate the false alarm rate. The run stops as soon as:
+- the interval excludes 0: 'improvement' or 'regression'
+- the interval lies within +-tolerance: 'no_change'
+and otherwise ends 'inconclusive' when the baseline games run out.
+
+Example:
+    python regression.py record --strategy HumanLike --games 20000
+    python regression.py check --strategy my_strategies.py:TweakedHumanLike --baseline HumanLike
+"""
+from __future__ import annotations
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass
+from game_rules import GameRules
+from game_state import GameState
+from parallel_runner import load_strategy, shard_seeds, stream_seeds
+from simulator import Simulator
+
+
+DEFAULT_DIRECTORY = 'baselines'
+# stored in every baseline file, bump it when the way games are seeded changes
+BASELINE_FORMAT = 2
+
+
+def rules_digest(rules: GameRules) -> str:
+    """
+    Short stable id of a rule set, used in baseline file names
+
+    >>> rules_digest(GameRules()) == rules_digest(GameRules())
+    True
+    >>> rules_digest(GameRules()) == rules_digest(GameRules(max_category_fills=3))
+    False
+    """
+    text = json.dumps(asdict(rules), sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def baseline_path(name: str, rules: GameRules, directory: str = DEFAULT_DIRECTORY) -> str:
+    safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+    return os.path.join(directory, f'{safe}-{rules_digest(rules)}.json')
+
+
+def iter_seeded_games(strategy, rules: GameRules, seeds: list[int]):
+    """
+    Play one game per seed, with the dice reseeded at the start of every turn, and yield
+    each finished GameState. The same state object is reset and reused for every game.
+    The game seed is split into separate seeds for the dice and for the random module
+    (see parallel_runner.stream_seeds), so the two never draw the same numbers.
+    """
+    sim = Simulator(rules, rng=random.Random())
+    sim.stats.keep_scores = False
+    state = GameState(rules, sim.score_calc)
+    for seed in seeds:
+        streams = stream_seeds(seed)
+        turn_seeds = random.Random(streams['dice'])
+        # strategies drawing from the shared random module get a per-game stream too
+        random.seed(streams['global'])
+        state.reset()
+        while not state.is_complete():
+            sim.roller.rng.seed(turn_seeds.getrandbits(63))
+            sim.simulate_turn(state, strategy)
+        yield state
+
+
+def play_games(strategy, rules: GameRules, seeds: list[int]) -> list[int]:
+    """
+    Final score of one game per seed, see iter_seeded_games
+    """
+    return [state.total_score for state in iter_seeded_games(strategy, rules, seeds)]
+
+
+@dataclass
+class Baseline:
+    """
+    Per-game final scores of a reference strategy, game i played from seeds[i]
+    """
+    name: str
+    rules: GameRules
+    seed: int
+    scores: list[int]
+
+    def game_seeds(self) -> list[int]:
+        return shard_seeds(self.seed, len(self.scores))
+
+    def mean(self) -> float:
+        return sum(self.scores) / len(self.scores) if self.scores else 0.0
+
+    def save(self, directory: str = DEFAULT_DIRECTORY) -> str:
+        path = baseline_path(self.name, self.rules, directory)
+        os.makedirs(directory, exist_ok=True)
+        data = {'format': BASELINE_FORMAT, 'name': self.name, 'rules': asdict(self.rules), 'seed': self.seed,
+                'scores': self.scores}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, name: str, rules: GameRules, directory: str = DEFAULT_DIRECTORY) -> "Baseline":
+        path = baseline_path(name, rules, directory)
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format') != BASELINE_FORMAT:
+            raise ValueError(f'{path} was recorded with an older seeding scheme, record the baseline again')
+        if data['rules'] != asdict(rules):
+            raise ValueError(f'{path} was recorded for different rules')
+        return cls(data['name'], rules, data['seed'], data['scores'])
+
+
+def record_baseline(strategy, rules: GameRules, name: str, n: int = 20000, seed: int = 0,
+                    directory: str | None = DEFAULT_DIRECTORY) -> Baseline:
+    """
+    Play n seeded games with the reference strategy and store them
+    :param directory: where to save the baseline (None: do not save)
+    """
+    baseline = Baseline(name, rules, seed, play_games(strategy, rules, shard_seeds(seed, n)))
+    if directory is not None:
+        baseline.save(directory)
+    return baseline
+
+
+def confidence_half_width(n: int, variance: float, tolerance: float, alpha: float) -> float:
+    """
+    Half-width of the always-valid (1 - alpha) interval for a mean after n paired games,
+    from the normal mixture with mixing standard deviation `tolerance`
+
+    >>> confidence_half_width(1000, 100.0, 1.0, 0.05) > confidence_half_width(4000, 100.0, 1.0, 0.05)
+    True
+    """
+    if n == 0:
+        return float('inf')
+    v = max(variance, 1e-12)
+    tau2 = tolerance * tolerance
+    spread = v + n * tau2
+    return math.sqrt(2 * v * spread / (n * n * tau2) * (math.log(1 / alpha) + 0.5 * math.log(spread / v)))
+
+
+@dataclass
+class RegressionResult:
+    """
+    Outcome of a sequential comparison against a baseline
+    """
+    # 'improvement', 'regression', 'no_change' or 'inconclusive'
+    verdict: str
+    games: int
+    baseline_mean: float
+    candidate_mean: float
+    # mean paired difference (candidate - baseline) and the half-width of its interval
+    mean_diff: float
+    half_width: float
+    # standard deviation of the paired differences (CRN keeps it small)
+    diff_std: float
+
+    @property
+    def interval(self) -> tuple[float, float]:
+        return self.mean_diff - self.half_width, self.mean_diff + self.half_width
+
+    def __repr__(self):
+        low, high = self.interval
+        return (f"RegressionResult({self.verdict}: diff={self.mean_diff:+.2f} [{low:+.2f}, {high:+.2f}], "
+                f"games={self.games}, baseline={self.baseline_mean:.2f}, candidate={self.candidate_mean:.2f}, "
+                f"diff_std={self.diff_std:.1f})")
+
+
+def compare_to_baseline(strategy, baseline: Baseline, tolerance: float = 1.0, alpha: float = 0.05,
+                        batch: int = 200, max_games: int | None = None) -> RegressionResult:
+    """
+    Replay the baseline games with the candidate strategy until the verdict is clear
+    :param strategy: candidate strategy instance
+    :param baseline: stored baseline to compare against
+    :param tolerance: mean score change (points) considered practically no change
+    :param alpha: false alarm probability over the whole sequential run
+    :param batch: games played between looks
+    :param max_games: stop after this many games (default: every baseline game)
+    :return: RegressionResult
+    """
+    seeds = baseline.game_seeds()
+    limit = len(seeds) if max_games is None else min(max_games, len(seeds))
+
+    n = 0
+    diff_sum = 0.0
+    diff_sq_sum = 0.0
+    base_sum = 0
+    cand_sum = 0
+    verdict = 'inconclusive'
+    mean = var = half = 0.0
+    while n < limit:
+        m = min(batch, limit - n)
+        scores = play_games(strategy, baseline.rules, seeds[n:n + m])
+        for score, base in zip(scores, baseline.scores[n:n + m]):
+            d = score - base
+            diff_sum += d
+            diff_sq_sum += d * d
+            base_sum += base
+            cand_sum += score
+        n += m
+
+        mean = diff_sum / n
+        var = max(diff_sq_sum / n - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+        half = confidence_half_width(n, var, tolerance, alpha)
+        if abs(mean) > half:
+            verdict = 'improvement' if mean > 0 else 'regression'
+            break
+        if abs(mean) + half <= tolerance:
+            verdict = 'no_change'
+            break
+
+    return RegressionResult(verdict=verdict, games=n, baseline_mean=base_sum / n if n else 0.0,
+                            candidate_mean=cand_sum / n if n else 0.0, mean_diff=mean,
+                            half_width=half, diff_std=math.sqrt(var))
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    from cli import add_rule_arguments, parse_rules
+
+    parser = argparse.ArgumentParser(description='Record strategy baselines and check changes against them')
+    parser.add_argument('command', choices=('record', 'check'))
+    parser.add_argument('--strategy', required=True, help='strategy name, module:Class or file.py:Class')
+    parser.add_argument('--baseline', help='baseline name (default: the strategy name)')
+    parser.add_argument('--directory', default=DEFAULT_DIRECTORY, help='baseline directory')
+    parser.add_argument('--games', type=int, default=20000, help='record: games in the baseline')
+    parser.add_argument('--seed', type=int, default=0, help='record: master seed of the games')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='check: points treated as no change')
+    parser.add_argument('--alpha', type=float, default=0.05, help='check: false alarm probability')
+    parser.add_argument('--batch', type=int, default=200, help='check: games between looks')
+    add_rule_arguments(parser)
+    args = parser.parse_args(argv)
+
+    rules = parse_rules(args)
+    name = args.baseline or args.strategy
+    strategy = load_strategy(args.strategy)()
+    if args.command == 'record':
+        baseline = record_baseline(strategy, rules, name, n=args.games, seed=args.seed, directory=args.directory)
+        print(f'{baseline_path(name, rules, args.directory)}: {len(baseline.scores)} games, mean {baseline.mean():.2f}')
+        return
+
+    result = compare_to_baseline(strategy, Baseline.load(name, rules, args.directory), tolerance=args.tolerance,
+                                 alpha=args.alpha, batch=args.batch)
+    print(result)
+    # non-zero exit status on a significant regression, for use in scripts and CI
+    sys.exit(1 if result.verdict == 'regression' else 0)
+
+
+if __name__ == "__main__":
+    main()
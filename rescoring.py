@@ -0,0 +1,203 @@
+"""
+rescoring.py
+
+Re-evaluate recorded games under different scoring rules without playing them again.
+
+record_games stores, for every game, the hand written into every category slot (as an
+index into the sorted hands of the rules, uint16). rescore builds a (category, hand) score
+table from a ScoreCalculator for the alternate rules, then looks up every slot of every game
+with NumPy in chunks (about a second per ten million games).
+
+Scoring-only fields may differ from the recorded rules: upper_bonus_reward, the upper bonus
+threshold, the fixed scores, the of-a-kind sizes and the straight lengths. Fields that change
+the dice or the turn (num_dice, num_faces, max_rerolls, max_category_fills) may not.
+
+Caveat: the recorded decisions were made under the recorded rules. A strategy that knows
+the new scoring could keep different dice or fill different categories, so rescored results
+describe the recorded strategy playing unchanged, not the strategy adapted to the new rules.
+Every RescoreResult carries this caveat with the fields that changed.
+"""
+from __future__ import annotations
+import json
+import random
+from dataclasses import asdict, dataclass, fields
+import numpy as np
+from game_rules import GameRules
+from parallel_runner import stream_seeds
+from policy_table import all_hands
+from score_calculator import ScoreCalculator
+from simulator import Simulator
+
+
+# fields that change the dice or the decisions, these must match the recorded games
+PLAY_FIELDS = ('num_dice', 'num_faces', 'max_rerolls', 'max_category_fills')
+# games rescored per NumPy batch
+RESCORE_CHUNK = 1 << 20
+
+
+class GameRecords:
+    """
+    The filled hand of every category slot of every recorded game
+    """
+
+    def __init__(self, rules: GameRules, categories: list[str], hands: np.ndarray, totals: np.ndarray):
+        """
+        :param rules: rules the games were played under
+        :param categories: category names, slot columns are category index * fills + fill number
+        :param hands: (games, slots) index of the filled hand in the sorted hand list of the rules
+        :param totals: (games,) recorded final scores
+        """
+        self.rules = rules
+        self.categories = categories
+        self.hands = hands
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.totals)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, hands=self.hands, totals=self.totals,
+                            categories=np.array(self.categories),
+                            rules=np.array(json.dumps(asdict(self.rules))))
+
+    @classmethod
+    def load(cls, path: str) -> "GameRecords":
+        with np.load(path) as data:
+            rules = GameRules(**json.loads(str(data['rules'])))
+            return cls(rules, [str(c) for c in data['categories']], data['hands'], data['totals'])
+
+
+def hand_list(rules: GameRules) -> list[tuple[int, ...]]:
+    hands = all_hands(rules)
+    if hands is None or len(hands) > np.iinfo(np.uint16).max:
+        raise ValueError(f'{rules} has too many distinct hands to record')
+    return hands
+
+
+def record_games(strategy, rules: GameRules, n: int, seed: int | None = None) -> GameRecords:
+    """
+    Play n games and record every filled hand. The strategy plays with its own rng seeded
+    from `seed` (separately from the dice, see parallel_runner.stream_seeds); its previous
+    rng is restored afterwards.
+    :param strategy: chosen strategy
+    :param rules: GameRules object
+    :param n: number of games
+    :param seed: seed for the dice and the strategy's rng
+    """
+    hands = hand_list(rules)
+    index = {hand: i for i, hand in enumerate(hands)}
+    seeds = stream_seeds(seed)
+    sim = Simulator(rules, rng=random.Random(seeds['dice']))
+    sim.stats.keep_scores = False
+    categories = sim.score_calc.get_all_categories()
+    column = {cat: i * rules.max_category_fills for i, cat in enumerate(categories)}
+
+    recorded = np.zeros((n, len(categories) * rules.max_category_fills), dtype=np.uint16)
+    totals = np.zeros(n, dtype=np.int32)
+    row = None
+
+    def on_fill(state, category, dice):
+        row[column[category] + state.fill_counts[category]] = index[tuple(sorted(dice))]
+
+    sim.fill_hook = on_fill
+    # Strategy.rng is a class attribute, restore the instance to exactly how it was
+    own_rng = vars(strategy).get('rng')
+    strategy.rng = random.Random(seeds['strategy'])
+    try:
+        for g in range(n):
+            row = recorded[g]
+            totals[g] = sim.simulate_game(strategy)
+    finally:
+        if own_rng is None:
+            del strategy.rng
+        else:
+            strategy.rng = own_rng
+    return GameRecords(rules, categories, recorded, totals)
+
+
+@dataclass
+class RescoreResult:
+    """
+    Recorded games scored under alternate scoring rules
+    """
+    totals: np.ndarray
+    upper_totals: np.ndarray
+    mean: float
+    std: float
+    bonus_rate: float
+    # mean of the recorded scores, for comparison
+    recorded_mean: float
+    # scoring fields that differ from the recorded rules
+    changed: dict[str, tuple]
+    caveat: str
+
+    @property
+    def std_error(self) -> float:
+        return self.std / np.sqrt(len(self.totals)) if len(self.totals) else 0.0
+
+    def __repr__(self):
+        return (f"RescoreResult(mean={self.mean:.2f} (recorded {self.recorded_mean:.2f}), "
+                f"se={self.std_error:.3f}, bonus_rate={self.bonus_rate:.3f}, games={len(self.totals)})\n"
+                f"  caveat: {self.caveat}")
+
+
+def score_table(rules: GameRules, categories: list[str], hands: list[tuple[int, ...]]) -> np.ndarray:
+    """
+    (category, hand) -> score under the given rules
+    """
+    calc = ScoreCalculator(rules)
+    table = np.zeros((len(categories), len(hands)), dtype=np.int32)
+    for h, hand in enumerate(hands):
+        scores = calc.score_all(list(hand), categories)
+        for c, cat in enumerate(categories):
+            table[c, h] = scores[cat]
+    return table
+
+
+def rescore(records: GameRecords, rules: GameRules, bonus_threshold: int | None = None) -> RescoreResult:
+    """
+    Score every recorded game under different scoring rules
+    :param records: GameRecords from record_games
+    :param rules: alternate rules, equal to the recorded rules in every PLAY_FIELDS field
+    :param bonus_threshold: upper bonus threshold (default: rules.upper_bonus_threshold)
+    :return: RescoreResult
+    """
+    for name in PLAY_FIELDS:
+        if getattr(rules, name) != getattr(records.rules, name):
+            raise ValueError(f'{name} changes the games themselves and cannot be rescored, simulate instead')
+
+    threshold = rules.upper_bonus_threshold if bonus_threshold is None else bonus_threshold
+    changed = {f.name: (getattr(records.rules, f.name), getattr(rules, f.name))
+               for f in fields(GameRules) if getattr(records.rules, f.name) != getattr(rules, f.name)}
+    if threshold != records.rules.upper_bonus_threshold:
+        changed['upper_bonus_threshold'] = (records.rules.upper_bonus_threshold, threshold)
+
+    table = score_table(rules, records.categories, hand_list(rules))
+    fills = rules.max_category_fills
+    # category index of every slot column, and which columns belong to the upper section
+    slot_categories = np.repeat(np.arange(len(records.categories)), fills)
+    upper_names = set(ScoreCalculator(rules).upper_faces)
+    upper_columns = np.array([records.categories[c] in upper_names for c in slot_categories])
+
+    n = len(records)
+    totals = np.empty(n, dtype=np.int64)
+    upper_totals = np.empty(n, dtype=np.int64)
+    for start in range(0, n, RESCORE_CHUNK):
+        hands = records.hands[start:start + RESCORE_CHUNK]
+        scores = table[slot_categories, hands]
+        upper = scores[:, upper_columns].sum(axis=1)
+        upper_totals[start:start + len(hands)] = upper
+        totals[start:start + len(hands)] = (scores.sum(axis=1) +
+                                            np.where(upper >= threshold, rules.upper_bonus_reward, 0))
+
+    if changed:
+        caveat = (f"decisions were made under the recorded values of {', '.join(changed)}; "
+                  f"a strategy aware of the new scoring may play differently, so this is the unchanged "
+                  f"strategy's score under the new rules, not the adapted strategy's")
+    else:
+        caveat = 'no scoring field changed'
+    return RescoreResult(totals=totals, upper_totals=upper_totals,
+                         mean=float(totals.mean()) if n else 0.0, std=float(totals.std()) if n else 0.0,
+                         bonus_rate=float((upper_totals >= threshold).mean()) if n else 0.0,
+                         recorded_mean=float(records.totals.mean()) if n else 0.0,
+                         changed=changed, caveat=caveat)
@@ -3,162 +3,162 @@ score_calculator.py
 
 Compute Yahtzee for each category
 """
-from collections import Counter
 from game_rules import GameRules
+from dice_utils import count_value
 
 
-# Upper Section Scoring
+# Scoring kinds used by ScoreCalculator.category_specs
+UPPER = 0
+N_OF_A_KIND = 1
+FULL_HOUSE = 2
+STRAIGHT = 3
+YAHTZEE = 4
+CHANCE = 5
 
-def score_upper_generic(dice: list[int], target_value: int) -> int:
-    """
-    Calculate score for specific value of dices for upper section
-    :param dice: input list of dices
-    :param target_value: The value to calculate score for
-    :return: score
-
-    >>> score_upper_generic([1, 2, 3, 3, 3], 3)
-    9
-    >>> score_upper_generic([4, 4, 2, 1], 4)
-    8
-    >>> score_upper_generic([1, 2, 3], 6)
-    0
 
-    """
-    return sum(d for d in dice if d == target_value)
+# Count-vector scoring: counts[f - 1] is how many dice show face f, total is the sum of the dice.
+# Each function is O(faces) regardless of the number of dice.
 
-# Lower Section Scoring
-def score_n_of_a_kind(dice: list[int], n: int) -> int:
+def score_n_of_a_kind_counts(counts: list[int], total: int, n: int) -> int:
     """
-    N_of_a_kind (3 of a kind, 4 of a kind)
-    :param dice: input list of dices
-    :param n: number of a kind
-    :return: score
-
-    >>> score_n_of_a_kind([3, 3, 3, 2, 1], 3)
+    >>> score_n_of_a_kind_counts([1, 1, 3, 0, 0, 0], 12, 3)
     12
-    >>> score_n_of_a_kind([5, 5, 5, 5, 2], 4)
-    22
-    >>> score_n_of_a_kind([1, 2, 3, 4, 5], 3)
+    >>> score_n_of_a_kind_counts([1, 1, 1, 1, 1, 0], 15, 3)
     0
     """
-    counts = Counter(dice)
-    if any(c >= n for c in counts.values()):
-        return sum(dice)
+    for c in counts:
+        if c >= n:
+            return total
     return 0
 
 
-def score_full_house(dice: list[int]) -> int:
+def score_full_house_counts(counts: list[int], fixed_score: int = 25) -> int:
     """
-    >>> score_full_house([2, 2, 3, 3, 3])
+    >>> score_full_house_counts([0, 2, 3, 0, 0, 0])
     25
-    >>> score_full_house([4, 4, 4, 4, 2])
+    >>> score_full_house_counts([1, 0, 0, 4, 0, 0])
     0
-    >>> score_full_house([1, 1, 2, 2, 3])
-    0
-
     """
-    counts = Counter(dice).values()
-    # if sorted(counts) == [2, 3]:
-    #     return 25
-    # return 0
-    c_list = list(counts)
-    if 3 in c_list and 2 in c_list:
-        return 25
+    if 3 in counts and 2 in counts:
+        return fixed_score
     return 0
 
 
-def score_straight_generic(dice: list[int], length_needed: int, fixed_score: int) -> int:
+def score_straight_counts(counts: list[int], length_needed: int, fixed_score: int) -> int:
     """
-    calculate score for straight
-
-    :param dice: input list of dices
-    :param length_needed: length of straight
-    :param fixed_score: score for straight
-    :return: score
-
-    # small straight
-    >>> score_straight_generic([1, 2, 3, 4, 6], 4, 30)
+    >>> score_straight_counts([1, 1, 1, 1, 0, 1], 4, 30)
     30
-
-    # large straight
-    >>> score_straight_generic([2, 3, 4, 5, 6], 5, 40)
-    40
-
-    # no straight
-    >>> score_straight_generic([1, 1, 3, 4, 6], 4, 30)
+    >>> score_straight_counts([2, 0, 1, 1, 0, 1], 4, 30)
     0
     """
-    unique_dice = sorted(set(dice))
-    if len(unique_dice) < length_needed:
-        return 0
-
-    consecutive_count = 1
-    max_consecutive = 1
-
-    for i in range(len(unique_dice) - 1):
-        if unique_dice[i + 1] == unique_dice[i] + 1:
-            consecutive_count += 1
-            max_consecutive = max(max_consecutive, consecutive_count)
+    run = 0
+    for c in counts:
+        if c:
+            run += 1
+            if run >= length_needed:
+                return fixed_score
         else:
-            consecutive_count = 1
-
-    if max_consecutive >= length_needed:
-        return fixed_score
+            run = 0
     return 0
 
 
-def score_yahtzee(dice: list[int]) -> int:
+def score_yahtzee_counts(counts: list[int], num_dice: int, fixed_score: int = 50) -> int:
     """
-    >>> score_yahtzee([6, 6, 6, 6, 6])
+    >>> score_yahtzee_counts([0, 0, 0, 0, 0, 5], 5)
     50
-    >>> score_yahtzee([6, 6, 6, 6, 5])
+    >>> score_yahtzee_counts([0, 0, 0, 0, 1, 4], 5)
     0
     """
-
-    if len(set(dice)) == 1:
-        return 50
-    else:
-        return 0
-
-def score_chance(dice: list[int]) -> int:
-    """
-    >>> score_chance([1, 2, 3, 4, 5])
-    15
-    >>> score_chance([6, 6, 6, 6, 6])
-    30
-    """
-    return sum(dice)
+    if num_dice in counts:
+        return fixed_score
+    return 0
 
 
 class ScoreCalculator:
     def __init__(self, rules: GameRules):
         self.rules = rules
-        self.category_functions = {}
+        # category name -> (scoring kind, parameter, fixed score)
+        self.category_specs: dict[str, tuple[int, int, int]] = {}
+        # upper category name -> face value
+        self.upper_faces: dict[str, int] = {}
         self.register_functions()
 
     def register_functions(self):
+        rules = self.rules
+
         # upper section
-        for i in range(1, self.rules.num_faces + 1):
+        for i in range(1, rules.num_faces + 1):
             category_name = f"upper_{i}"
-            self.category_functions[category_name] = lambda d, val=i: score_upper_generic(d, val)
+            self.category_specs[category_name] = (UPPER, i, 0)
+            self.upper_faces[category_name] = i
 
         # lower section
-        self.category_functions['three_of_a_kind'] = lambda d:score_n_of_a_kind(d, 3)
-        self.category_functions['four_of_a_kind'] = lambda d:score_n_of_a_kind(d, 4)
-        self.category_functions['full_house'] = score_full_house
-        self.category_functions['yahtzee'] = score_yahtzee
-        self.category_functions['chance'] = score_chance
+        self.category_specs['three_of_a_kind'] = (N_OF_A_KIND, rules.three_of_a_kind_size, 0)
+        self.category_specs['four_of_a_kind'] = (N_OF_A_KIND, rules.four_of_a_kind_size, 0)
+        self.category_specs['full_house'] = (FULL_HOUSE, 0, rules.full_house_score)
+        self.category_specs['yahtzee'] = (YAHTZEE, rules.num_dice, rules.yahtzee_score)
+        self.category_specs['chance'] = (CHANCE, 0, 0)
+
+        # for straight, the parameter is the length needed
+        self.category_specs['small_straight'] = (STRAIGHT, rules.small_straight_length, rules.small_straight_score)
+        self.category_specs['large_straight'] = (STRAIGHT, rules.large_straight_length, rules.large_straight_score)
+
+    def calculate_counts(self, category: str, counts: list[int], total: int) -> int:
+        """
+        Score a category from the face count vector and the sum of the dice
+        """
+        spec = self.category_specs.get(category)
+        if spec is None:
+            raise ValueError(f'Unknown category: {category}')
 
-        # for straight
-        self.category_functions['small_straight'] = lambda d: score_straight_generic(d, length_needed= 4, fixed_score=30)
-        self.category_functions['large_straight'] = lambda d: score_straight_generic(d, length_needed= 5, fixed_score=40)
+        kind, param, fixed = spec
+        if kind == UPPER:
+            return counts[param - 1] * param
+        if kind == N_OF_A_KIND:
+            return score_n_of_a_kind_counts(counts, total, param)
+        if kind == STRAIGHT:
+            return score_straight_counts(counts, param, fixed)
+        if kind == FULL_HOUSE:
+            return score_full_house_counts(counts, fixed)
+        if kind == YAHTZEE:
+            return score_yahtzee_counts(counts, param, fixed)
+        return total
 
     def calculate(self, category: str, dice: list[int]) -> int:
-
-        if category not in self.category_functions:
-            raise ValueError(f'Unknown category: {category}')
-
-        return self.category_functions[category](dice)
+        """
+        Score a category for a list of dice
+
+        >>> calc = ScoreCalculator(GameRules())
+        >>> calc.calculate('upper_3', [1, 2, 3, 3, 3]), calc.calculate('four_of_a_kind', [5, 5, 5, 5, 2])
+        (9, 22)
+        >>> calc.calculate('full_house', [2, 2, 3, 3, 3]), calc.calculate('small_straight', [1, 1, 3, 4, 6])
+        (25, 0)
+        >>> calc.calculate('yahtzee', [6, 6, 6, 6, 6]), calc.calculate('chance', [1, 2, 3, 4, 5])
+        (50, 15)
+        """
+        counts = count_value(dice, self.rules.num_faces)
+        return self.calculate_counts(category, counts, sum(dice))
+
+    def score_all(self, dice: list[int], categories: list[str] | None = None,
+                  out: dict[str, int] | None = None) -> dict[str, int]:
+        """
+        Score several categories at once, counting the dice only one time
+        :param dice: input dice
+        :param categories: categories to score (default all)
+        :param out: optional dict to clear and fill instead of allocating a new one
+        :return: dict of category -> score
+        """
+        counts = count_value(dice, self.rules.num_faces)
+        total = sum(dice)
+        if categories is None:
+            categories = self.category_specs
+        if out is None:
+            out = {}
+        else:
+            out.clear()
+        for cat in categories:
+            out[cat] = self.calculate_counts(cat, counts, total)
+        return out
 
     def get_all_categories(self) -> list[str]:
-        return list(self.category_functions.keys())
\ No newline at end of file
+        return list(self.category_specs.keys())
@@ -0,0 +1,197 @@
+"""
+sensitivity.py
+
+How the average score and the strategy ranking respond to single GameRules fields.
+
+Each field is moved one step down and one step up from the base rules (one at a time), and
+the derivative of every strategy's mean score is estimated by finite differences:
+- fields that change the dice or the decisions (num_faces, max_rerolls, ...) are simulated
+  again, game i from the same seed in every configuration (common random numbers, see
+  regression.iter_seeded_games), so the paired differences are far less noisy than
+  independent runs
+- fields that only change the scoring (upper_bonus_reward) are not simulated again: the
+  base games are rescored. This assumes the strategy would make the same decisions under
+  the new value; strategies that read the field (e.g. ExpectimaxStrategy reads the bonus
+  reward) may adapt in ways the rescored numbers do not show.
+
+The cost is one base run plus two runs per simulated field, instead of a full grid.
+"""
+from __future__ import annotations
+import math
+from dataclasses import dataclass, field, replace
+from game_rules import GameRules
+from parallel_runner import shard_seeds
+from regression import iter_seeded_games
+
+
+# fields whose effect is computed by rescoring the base games
+RESCORED_FIELDS = ('upper_bonus_reward',)
+
+DEFAULT_FIELDS = ('upper_bonus_reward', 'num_faces', 'max_rerolls')
+DEFAULT_STEPS = {'upper_bonus_reward': 5}
+
+
+def ranking(means: dict[str, float]) -> list[str]:
+    """
+    Strategy names, best average first
+
+    >>> ranking({'a': 1.0, 'b': 3.0, 'c': 2.0})
+    ['b', 'c', 'a']
+    """
+    return sorted(means, key=means.get, reverse=True)
+
+
+def _mean_and_se(values: list[float]) -> tuple[float, float]:
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, 0.0
+    var = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, math.sqrt(var / n)
+
+
+@dataclass
+class FieldSensitivity:
+    """
+    Effect of one rule field around the base rules
+    """
+    name: str
+    base_value: int
+    # field values evaluated, ascending (always includes base_value)
+    values: list[int]
+    # strategy -> mean score at each value
+    means: dict[str, list[float]]
+    # strategy -> d(mean score) / d(field) at the base value, and its standard error
+    derivatives: dict[str, float]
+    std_errors: dict[str, float]
+    # True when the values were rescored from the base games instead of simulated
+    rescored: bool
+    # field value -> strategy names, best first
+    rankings: dict[int, list[str]]
+    # pairs of strategies whose order flips at (approximately) this field value, rescored fields only
+    crossings: dict[tuple[str, str], float] = field(default_factory=dict)
+
+    @property
+    def rank_stable(self) -> bool:
+        """
+        Same strategy order at every evaluated value
+        """
+        orders = list(self.rankings.values())
+        return all(order == orders[0] for order in orders)
+
+
+@dataclass
+class SensitivityReport:
+    rules: GameRules
+    n_games: int
+    fields: dict[str, FieldSensitivity]
+    # games actually simulated, and what a full grid over the same values would have cost
+    games_simulated: int
+    full_grid_games: int
+
+    def __repr__(self):
+        lines = [f"Sensitivity around {self.rules}, {self.n_games} games per point "
+                 f"({self.games_simulated} simulated vs {self.full_grid_games} for the full grid)"]
+        for fs in self.fields.values():
+            how = 'rescored' if fs.rescored else 'simulated'
+            lines.append(f"  {fs.name} = {fs.base_value} ({how}, values {fs.values}, "
+                         f"ranking {'stable' if fs.rank_stable else 'CHANGES'})")
+            for name, d in fs.derivatives.items():
+                lines.append(f"    {name:20s} d(mean)/d({fs.name}) = {d:+8.3f} +- {fs.std_errors[name]:.3f}")
+            for (a, b), value in fs.crossings.items():
+                lines.append(f"    {a} and {b} swap order at {fs.name} ~ {value:.1f}")
+        return '\n'.join(lines)
+
+
+def _play(strategy, rules: GameRules, seeds: list[int]) -> tuple[list[int], list[bool]]:
+    totals, bonuses = [], []
+    for state in iter_seeded_games(strategy, rules, seeds):
+        totals.append(state.total_score)
+        bonuses.append(state.upper_bonus > 0)
+    return totals, bonuses
+
+
+def analyze(strategies: dict, rules: GameRules, fields: tuple[str, ...] = DEFAULT_FIELDS, n: int = 2000,
+            seed: int = 0, steps: dict[str, int] | None = None) -> SensitivityReport:
+    """
+    One-at-a-time sensitivity of every strategy's mean score to each field
+    :param strategies: name -> strategy instance
+    :param rules: base rules
+    :param fields: GameRules fields to vary
+    :param n: games per configuration
+    :param seed: master seed of the shared per-game seeds
+    :param steps: field -> step size (default 1, 5 for upper_bonus_reward)
+    :return: SensitivityReport
+    """
+    step_sizes = {**DEFAULT_STEPS, **(steps or {})}
+    seeds = shard_seeds(seed, n)
+
+    base = {name: _play(strategy, rules, seeds) for name, strategy in strategies.items()}
+    games_simulated = n * len(strategies)
+    full_grid_points = 1
+
+    results = {}
+    for name in fields:
+        step = step_sizes.get(name, 1)
+        base_value = getattr(rules, name)
+        values = [v for v in (base_value - step, base_value, base_value + step) if v >= 1 or name in RESCORED_FIELDS]
+        full_grid_points *= len(values)
+
+        if name in RESCORED_FIELDS:
+            results[name] = _rescored_field(name, base_value, values, base, rules)
+            continue
+
+        scores = {}
+        for value in values:
+            if value == base_value:
+                scores[value] = {s: base[s][0] for s in strategies}
+                continue
+            neighbour = replace(rules, **{name: value})
+            scores[value] = {s: _play(strategy, neighbour, seeds)[0] for s, strategy in strategies.items()}
+            games_simulated += n * len(strategies)
+        results[name] = _simulated_field(name, base_value, values, scores)
+
+    return SensitivityReport(rules=rules, n_games=n, fields=results, games_simulated=games_simulated,
+                             full_grid_games=n * len(strategies) * full_grid_points)
+
+
+def _simulated_field(name: str, base_value: int, values: list[int], scores: dict) -> FieldSensitivity:
+    low, high = values[0], values[-1]
+    means, derivatives, std_errors = {}, {}, {}
+    for s in scores[base_value]:
+        means[s] = [sum(scores[v][s]) / len(scores[v][s]) for v in values]
+        # paired per-game differences between the outer values (central difference when both exist)
+        diffs = [(b - a) / (high - low) for a, b in zip(scores[low][s], scores[high][s])]
+        derivatives[s], std_errors[s] = _mean_and_se(diffs)
+    rankings = {v: ranking({s: means[s][i] for s in means}) for i, v in enumerate(values)}
+    return FieldSensitivity(name=name, base_value=base_value, values=values, means=means,
+                            derivatives=derivatives, std_errors=std_errors, rescored=False, rankings=rankings)
+
+
+def _rescored_field(name: str, base_value: int, values: list[int], base: dict, rules: GameRules) -> FieldSensitivity:
+    # upper_bonus_reward: total = everything else + reward * got_bonus, so d(total)/d(reward) = got_bonus
+    means, derivatives, std_errors = {}, {}, {}
+    for s, (totals, bonuses) in base.items():
+        n = len(totals)
+        mean = sum(totals) / n
+        rate = sum(bonuses) / n
+        means[s] = [mean + rate * (v - base_value) for v in values]
+        derivatives[s] = rate
+        std_errors[s] = math.sqrt(rate * (1 - rate) / n)
+
+    rankings = {v: ranking({s: means[s][i] for s in means}) for i, v in enumerate(values)}
+
+    # the mean is linear in the reward, so the value where two strategies tie is exact (for fixed decisions)
+    crossings = {}
+    names = list(base)
+    base_index = values.index(base_value)
+    for i, a in enumerate(names):
+        for b in names[i + 1:]:
+            slope = derivatives[a] - derivatives[b]
+            if slope != 0:
+                tie = base_value - (means[a][base_index] - means[b][base_index]) / slope
+                if tie >= 0:
+                    crossings[a, b] = tie
+    return FieldSensitivity(name=name, base_value=base_value, values=values, means=means,
+                            derivatives=derivatives, std_errors=std_errors, rescored=True,
+                            rankings=rankings, crossings=crossings)
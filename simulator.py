@@ -10,21 +10,36 @@ The simulator:
 """
 
 from __future__ import annotations
-from dice_utils import roll_dice, reroll_with_keep
+import random
+import time
+from dice_utils import DiceRoller, keep_mask_from_indices
 from game_state import GameState
 from stats_collector import StatsCollector
 from score_calculator import ScoreCalculator
 from game_rules import GameRules
 
 class Simulator:
-    def __init__(self, rules: GameRules):
+    def __init__(self, rules: GameRules, rng=None, reuse_buffers: bool = True):
         """
         :param rules: GameRules object
+        :param rng: random.Random used for the dice (default: the shared random module)
+        :param reuse_buffers: reuse one GameState and dice buffer across games and turns,
+            with keep decisions passed as bitmasks
         """
 
         self.rules = rules
         self.score_calc = ScoreCalculator(rules)
         self.stats = StatsCollector(rules)
+        self.roller = DiceRoller(rules.num_faces, rng)
+
+        self.reuse_buffers = reuse_buffers
+        self._state: GameState | None = None
+        self._dice = [0] * rules.num_dice
+        self._full_mask = (1 << rules.num_dice) - 1
+        # optional callback(state, category, dice) run before each category is filled
+        self.fill_hook = None
+        # (rolls, category, score) per turn of the current game, while the stats capture exemplars
+        self._turns: list[tuple] | None = None
 
 
     # Simulate for a single turn
@@ -41,10 +56,53 @@ class Simulator:
         2) choose_category(dice: list[int], state: GameState)
             -> returns a category name string
 
+        Strategies may also implement choose_keep_mask(dice, roll_index, state) -> int
+        (bit i set = keep die i), used when reuse_buffers is on.
+
         The simulator does NOT judge the strategy; it just follows it.
         """
+        rolls = [] if self._turns is not None else None
+        if self.reuse_buffers:
+            dice = self._reroll_in_place(state, strategy, rolls)
+        else:
+            dice = self._reroll_copies(state, strategy, rolls)
+
+        category = strategy.choose_category(dice, state)
+        if self.fill_hook is not None:
+            self.fill_hook(state, category, dice)
+
+        score = state.apply_category(category, dice)
+        self.stats.record_category(category, score)
+        if rolls is not None:
+            self._turns.append((rolls, category, score))
+
+    def _reroll_in_place(self, state: GameState, strategy, rolls: list | None = None) -> list[int]:
+        dice = self._dice
+        self.roller.roll_into(dice)
+        if rolls is not None:
+            rolls.append(tuple(dice))
+
+        choose_mask = getattr(strategy, 'choose_keep_mask', None)
+        for roll_index in range(self.rules.max_rerolls):
+            if choose_mask is not None:
+                keep_mask = choose_mask(dice, roll_index, state)
+            else:
+                keep_mask = keep_mask_from_indices(strategy.choose_dice_to_keep(dice, roll_index, state),
+                                                  len(dice))
+
+            if keep_mask == self._full_mask:
+                break
+
+            self.roller.reroll_mask(dice, keep_mask)
+            if rolls is not None:
+                rolls.append(tuple(dice))
+        return dice
+
+    def _reroll_copies(self, state: GameState, strategy, rolls: list | None = None) -> list[int]:
         # first roll(all dices)
-        dice = roll_dice(self.rules.num_dice, self.rules.num_faces)
+        dice = self.roller.roll(self.rules.num_dice)
+        if rolls is not None:
+            rolls.append(tuple(dice))
 
         # maximum two more reroll chances
         for roll_index in range(self.rules.max_rerolls):  # roll_index=0: 2 more chance, roll_index=1: one more chance
@@ -53,15 +111,10 @@ class Simulator:
             if len(keep_indices) == self.rules.num_dice:
                 break
 
-            dice = reroll_with_keep(dice, keep_indices, faces=self.rules.num_faces)
-
-
-        category = strategy.choose_category(dice, state)
-
-        score = self.score_calc.calculate(category, dice)
-        self.stats.record_category(category, score)
-
-        state.apply_category(category, dice)
+            dice = self.roller.reroll_with_keep(dice, keep_indices)
+            if rolls is not None:
+                rolls.append(tuple(dice))
+        return dice
 
     # Simulate for a full game
 
@@ -71,10 +124,18 @@ class Simulator:
         :param strategy: chosen strategy
         :return: final score of the game
         """
-        state = GameState(self.rules, self.score_calc)
-
+        if not self.reuse_buffers:
+            state = GameState(self.rules, self.score_calc)
+        elif self._state is None:
+            state = self._state = GameState(self.rules, self.score_calc)
+        else:
+            state = self._state
+            state.reset()
+
+        turns = self._turns = [] if self.stats.exemplars is not None else None
         while not state.is_complete():
             self.simulate_turn(state, strategy)
+        self._turns = None
 
         get_bonus = state.upper_bonus > 0
         #return state.total_score
@@ -82,7 +143,8 @@ class Simulator:
             final_score=state.total_score,
             upper_total = state.upper_total,
             got_bonus = get_bonus,
-            game_state_copy=state.copy()
+            game_state=state,
+            turns=turns
         )
 
 
@@ -90,13 +152,35 @@ class Simulator:
 
     # Batch simulation for monte carlo
 
-    def simulate_many(self, strategy, n:int = 1000) -> float:
+    def simulate_many(self, strategy, n:int = 1000, checkpoint_path: str | None = None,
+                      checkpoint_every: int = 100000, progress=None, target_overhead: float = 0.05,
+                      seed: int | None = None) -> float:
         """
         Run many games using the given strategy and get the average score.
         :param strategy: chosen strategy
         :param n: number of games to simulate
+        :param checkpoint_path: file to checkpoint progress to, an existing checkpoint
+            for the same job is resumed
+        :param checkpoint_every: games between checkpoints
+        :param seed: reseed the dice and the shared random module before the first game, with
+            separate streams (parallel_runner.stream_seeds); part of the checkpoint's job, so a
+            checkpoint only resumes with the seed it was written with (default: keep the current state)
+        :param progress: function(convergence.Progress) called between adaptive batches of games
+            (not used with checkpoint_path)
+        :param target_overhead: largest fraction of the run spent between batches (building the
+            Progress snapshot and its diagnostics, and the callback). In a serial run this fixed cost
+            is usually tiny, so batches grow mainly to last at least half a second each.
         :return: average score of the games
         """
+        if seed is not None:
+            from parallel_runner import stream_seeds
+            streams = stream_seeds(seed)
+            self.roller.rng = random.Random(streams['dice'])
+            random.seed(streams['global'])
+        if checkpoint_path is not None:
+            return self._simulate_many_checkpointed(strategy, n, checkpoint_path, checkpoint_every, seed)
+        if progress is not None:
+            return self._simulate_many_reporting(strategy, n, progress, target_overhead)
 
         total_score = 0
         for _ in range(n):
@@ -104,6 +188,122 @@ class Simulator:
         #self.stats.report()
         return total_score / n
 
+    def _simulate_many_reporting(self, strategy, n: int, progress, target_overhead: float) -> float:
+        from convergence import AdaptiveBatcher, BatchMeans, Progress
+
+        batch_means = BatchMeans()
+        # Overhead is the fixed cost per batch: the Progress snapshot (batch-means diagnostics)
+        # and the callback. Per-game bookkeeping (stats, BatchMeans.add) grows with the batch and
+        # counts as work, so a cheap callback leaves min_seconds to set the batch size.
+        batcher = AdaptiveBatcher(initial=100, target_overhead=target_overhead, min_seconds=0.5)
+        start = time.perf_counter()
+        games_done = 0
+        while games_done < n:
+            batch = min(batcher.size, n - games_done)
+            batch_start = time.perf_counter()
+            for _ in range(batch):
+                batch_means.add(self.simulate_game(strategy))
+            games_done += batch
+
+            played = time.perf_counter()
+            # everything from here to the next batch is overhead
+            progress(Progress(games=games_done, max_games=n, elapsed=played - start, mean=batch_means.mean(),
+                              std_error=batch_means.iid_std_error(), batch_std_error=batch_means.std_error(),
+                              autocorrelation=batch_means.autocorrelation(), batch_games=batcher.size,
+                              overhead_fraction=batcher.overhead_fraction))
+            batcher.update(played - batch_start, time.perf_counter() - played)
+        return batch_means.mean()
+
+    def _simulate_many_checkpointed(self, strategy, n: int, path: str, every: int, seed: int | None) -> float:
+        # imported here so plain runs and worker start-up skip pickle
+        from checkpoint import job_spec, load_checkpoint, save_checkpoint
+
+        spec = job_spec(self.rules, strategy, n, seed)
+        games_done = 0
+        total_score = 0
 
+        payload = load_checkpoint(path, spec)
+        if payload is not None:
+            games_done = payload['games_done']
+            total_score = payload['total_score']
+            self.stats = payload['stats']
+            random.setstate(payload['global_rng_state'])
+            if self.roller.rng is not random:
+                self.roller.rng.setstate(payload['dice_rng_state'])
+
+        while games_done < n:
+            batch = min(every, n - games_done)
+            for _ in range(batch):
+                total_score += self.simulate_game(strategy)
+            games_done += batch
+
+            save_checkpoint(path, {
+                'spec': spec,
+                'games_done': games_done,
+                'total_score': total_score,
+                'stats': self.stats,
+                'global_rng_state': random.getstate(),
+                'dice_rng_state': self.roller.rng.getstate(),
+            })
 
+        return total_score / n
 
+    def simulate_parallel(self, strategy_name: str, n: int = 1000, workers: int = 4, seed: int | None = None,
+                          mode: str = 'auto', shard_size: int | None = None) -> float:
+        """
+        Run many games in a pool of threads or processes and merge them into self.stats.
+        Each shard builds its own strategy instance from the name, with its own random stream.
+        Shards keep no per-game lists, so self.stats stops keeping them too: its lists are
+        cleared and keep_scores is set to False (the streaming aggregates are kept).
+        :param strategy_name: name accepted by parallel_runner.load_strategy
+        :param n: number of games to simulate
+        :param workers: pool size
+        :param seed: master seed of the shards
+        :param mode: 'thread', 'process', or 'auto' (threads only when the GIL is disabled)
+        :param shard_size: games per shard (default: parallel_runner.DEFAULT_SHARD_SIZE)
+        :return: average score of the games
+        """
+        from parallel_runner import DEFAULT_SHARD_SIZE, run_games
+        stats = run_games(self.rules, strategy_name, n, workers=workers, seed=seed, mode=mode,
+                          shard_size=shard_size or DEFAULT_SHARD_SIZE)
+        self._merge_shards(stats)
+        return stats.mean()
+
+    def simulate_to_precision(self, strategy_name: str, target_se: float, max_games: int = 1_000_000,
+                              workers: int = 4, seed: int | None = None, mode: str = 'auto',
+                              shard_size: int | None = None, progress=None) -> float:
+        """
+        Like simulate_parallel, but stop once the standard error of the mean score is at most target_se.
+        Shards are grouped into adaptive batches, see parallel_runner.run_to_precision.
+        :param progress: function(convergence.Progress) called after every batch, e.g. convergence.print_progress
+        :return: average score of the games
+        """
+        from parallel_runner import DEFAULT_SHARD_SIZE, run_to_precision
+        stats = run_to_precision(self.rules, strategy_name, target_se, max_games, workers=workers, seed=seed,
+                                 shard_size=shard_size or DEFAULT_SHARD_SIZE, mode=mode, progress=progress)
+        self._merge_shards(stats)
+        return stats.mean()
+
+    def _merge_shards(self, stats: StatsCollector) -> None:
+        # partial per-game lists would be misleading, drop them and keep only the aggregates
+        if self.stats.keep_scores:
+            self.stats.keep_scores = False
+            self.stats.total_scores = []
+            self.stats.upper_totals = []
+            self.stats.chance_scores = []
+        self.stats.merge(stats)
+
+    def estimate_mean(self, strategy, n: int = 1000, antithetic: bool = False,
+                      controls: tuple[str, ...] = (), seed: int | None = None):
+        """
+        Estimate the average score with antithetic dice and/or control variates.
+        :param strategy: chosen strategy
+        :param n: number of games to simulate
+        :param antithetic: play mirrored pairs of games (face f <-> faces + 1 - f); for Yahtzee this
+            usually lowers the effective sample size, and a RuntimeWarning says so when it does
+        :param controls: control variates, any of 'opening_sum', 'opening_yahtzees'
+        :param seed: seed for the dice streams
+        :return: MeanEstimate with standard error and effective sample size
+        """
+        from variance_reduction import estimate_mean
+        return estimate_mean(self, strategy, n=n, antithetic=antithetic, controls=controls, seed=seed)
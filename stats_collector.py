@@ -1,17 +1,46 @@
 import math
 from collections import defaultdict
+from exemplars import ExemplarBuffer
 from game_rules import GameRules
+from game_state import GameState
+from score_calculator import ScoreCalculator
 
 
 
+# Running-mean checkpoints are recorded each time the game count grows by this factor
+CHECKPOINT_GROWTH = 1.02
+
+
 class StatsCollector:
-    def __init__(self, rules: GameRules):
+    def __init__(self, rules: GameRules, keep_scores: bool = True, exemplars: ExemplarBuffer | None = None):
+        """
+        :param rules: GameRules object
+        :param keep_scores: also keep every per-game score in lists (memory grows with games)
+        :param exemplars: buffer that captures the top, bottom and sampled games with their turns
+            (default None: nothing is captured and the simulator logs no turns)
+        """
         self.rules = rules
+        self.keep_scores = keep_scores
         self.total_scores = []
 
+        # streaming aggregates, constant memory
+        self.n_games = 0
+        self.score_sum = 0
+        self.score_sq_sum = 0
+        self.max_score = float('-inf')
+        self.upper_sum = 0
+        self.chance_count = 0
+        self.chance_sum = 0
+        # final score -> number of games
+        self.score_histogram = defaultdict(int)
+        # downsampled running mean: (games, mean, std_error), geometrically spaced
+        self.convergence: list[tuple[int, float, float]] = []
+        self._next_checkpoint = 1
+
         # lowest game record
         self.min_score = float('inf')
         self.min_score_game_state = None
+        self.exemplars = exemplars
 
 
         self.upper_totals = []
@@ -25,9 +54,25 @@ class StatsCollector:
         self.category_usage = defaultdict(int)
 
 
-    def record_game(self, final_score, upper_total, got_bonus, game_state_copy):
-        self.total_scores.append(final_score)
-        self.upper_totals.append(upper_total)
+    def record_game(self, final_score, upper_total, got_bonus, game_state=None, turns=None):
+        """
+        :param game_state: GameState at the end of the game, copied only for a new lowest score or
+            when the exemplar buffer keeps it
+        :param turns: turn log of the game, see exemplars.Exemplar.from_state
+        """
+        self.n_games += 1
+        self.score_sum += final_score
+        self.score_sq_sum += final_score * final_score
+        self.upper_sum += upper_total
+        if final_score > self.max_score:
+            self.max_score = final_score
+        self.score_histogram[final_score] += 1
+        if self.n_games >= self._next_checkpoint:
+            self.add_checkpoint()
+
+        if self.keep_scores:
+            self.total_scores.append(final_score)
+            self.upper_totals.append(upper_total)
 
         if got_bonus:
             self.bonus_count += 1
@@ -35,43 +80,215 @@ class StatsCollector:
 
         if final_score < self.min_score:
             self.min_score = final_score
-            self.min_score_game_state = game_state_copy
+            if game_state is not None:
+                self.min_score_game_state = game_state.copy()
+        if game_state is not None and self.exemplars is not None:
+            self.exemplars.offer(game_state, turns)
 
 
     def record_category(self, category, score):
         self.category_usage[category] += 1
         if category == "chance":
-            self.chance_scores.append(score)
+            self.chance_count += 1
+            self.chance_sum += score
+            if self.keep_scores:
+                self.chance_scores.append(score)
 
-        if category == "yahtzee" and score == 50:
+        if category == "yahtzee" and score == self.rules.yahtzee_score:
             self.yahtzee_hits += 1
 
-        if category == "small_straight" and score == 30:
+        if category == "small_straight" and score == self.rules.small_straight_score:
             self.small_straight_hits += 1
 
-        if category == "large_straight" and score == 40:
+        if category == "large_straight" and score == self.rules.large_straight_score:
             self.large_straight_hits += 1
 
+    def merge(self, other: "StatsCollector") -> None:
+        """
+        Add the games recorded by another collector (e.g. a parallel shard) into this one.
+        Both must agree on keep_scores, otherwise the per-game lists would silently miss games.
+        """
+        if self.keep_scores != other.keep_scores:
+            raise ValueError(f'cannot merge a collector with keep_scores={other.keep_scores} '
+                             f'into one with keep_scores={self.keep_scores}')
+        self.n_games += other.n_games
+        self.score_sum += other.score_sum
+        self.score_sq_sum += other.score_sq_sum
+        self.max_score = max(self.max_score, other.max_score)
+        self.upper_sum += other.upper_sum
+        self.chance_count += other.chance_count
+        self.chance_sum += other.chance_sum
+        self.bonus_count += other.bonus_count
+        self.yahtzee_hits += other.yahtzee_hits
+        self.small_straight_hits += other.small_straight_hits
+        self.large_straight_hits += other.large_straight_hits
+        for cat, count in other.category_usage.items():
+            self.category_usage[cat] += count
+        for score, count in other.score_histogram.items():
+            self.score_histogram[score] += count
+        # running means of separate shards do not interleave, continue the curve from the merged
+        # totals on the same geometric schedule as single games
+        if self.n_games >= self._next_checkpoint:
+            self.add_checkpoint()
+
+        if self.keep_scores:
+            self.total_scores.extend(other.total_scores)
+            self.upper_totals.extend(other.upper_totals)
+            self.chance_scores.extend(other.chance_scores)
+
+        if other.min_score < self.min_score:
+            self.min_score = other.min_score
+            self.min_score_game_state = other.min_score_game_state
+        if self.exemplars is not None and other.exemplars is not None:
+            self.exemplars.merge(other.exemplars)
+
+    def to_dict(self) -> dict:
+        """
+        Streaming aggregates as JSON-compatible data, for sending a shard's result over the network.
+        Per-game lists are not included.
+        """
+        low = self.min_score_game_state
+        return {
+            'n_games': self.n_games,
+            'score_sum': self.score_sum,
+            'score_sq_sum': self.score_sq_sum,
+            'max_score': self.max_score if self.n_games else None,
+            'min_score': self.min_score if self.n_games else None,
+            'upper_sum': self.upper_sum,
+            'chance_count': self.chance_count,
+            'chance_sum': self.chance_sum,
+            'bonus_count': self.bonus_count,
+            'yahtzee_hits': self.yahtzee_hits,
+            'small_straight_hits': self.small_straight_hits,
+            'large_straight_hits': self.large_straight_hits,
+            'category_usage': dict(self.category_usage),
+            'score_histogram': [[score, count] for score, count in self.score_histogram.items()],
+            'convergence': [list(point) for point in self.convergence],
+            'min_game': None if low is None else {
+                'category_scores': low.category_scores,
+                'upper_total': low.upper_total,
+                'upper_bonus': low.upper_bonus,
+                'total_score': low.total_score,
+            },
+            'exemplars': self.exemplars.to_dict() if self.exemplars is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, rules: GameRules, data: dict) -> "StatsCollector":
+        """
+        Rebuild a collector from to_dict() output
+        """
+        stats = cls(rules, keep_scores=False)
+        if data.get('exemplars') is not None:
+            stats.exemplars = ExemplarBuffer.from_dict(data['exemplars'])
+        for key in ('n_games', 'score_sum', 'score_sq_sum', 'upper_sum', 'chance_count', 'chance_sum',
+                    'bonus_count', 'yahtzee_hits', 'small_straight_hits', 'large_straight_hits'):
+            setattr(stats, key, data[key])
+        if data['n_games']:
+            stats.max_score = data['max_score']
+            stats.min_score = data['min_score']
+        stats.category_usage.update(data['category_usage'])
+        for score, count in data['score_histogram']:
+            stats.score_histogram[score] += count
+        stats.convergence = [tuple(point) for point in data.get('convergence', ())]
+
+        low = data.get('min_game')
+        if low is not None:
+            state = GameState(rules, ScoreCalculator(rules))
+            state.category_scores = {cat: list(scores) for cat, scores in low['category_scores'].items()}
+            state.fill_counts = {cat: len(scores) for cat, scores in state.category_scores.items()}
+            state.filled_count = sum(state.fill_counts.values())
+            state.upper_total = low['upper_total']
+            state.upper_bonus = low['upper_bonus']
+            state.total_score = low['total_score']
+            stats.min_score_game_state = state
+
+        stats.add_checkpoint()
+        return stats
+
+    def convergence_point(self) -> tuple[int, float, float]:
+        """
+        Current (games, mean, std_error)
+        """
+        n = self.n_games
+        return n, self.mean(), math.sqrt(self.variance() / n) if n else 0.0
+
+    def add_checkpoint(self) -> None:
+        """
+        Append the current (games, mean, std_error) to the convergence curve
+
+        >>> stats = StatsCollector(GameRules(), keep_scores=False)
+        >>> for _ in range(2000):
+        ...     shard = StatsCollector(GameRules(), keep_scores=False)
+        ...     for score in (100, 200):
+        ...         shard.record_game(score, 0, False)
+        ...     stats.merge(shard)
+        >>> stats.n_games, len(stats.convergence) < 400
+        (4000, True)
+        """
+        n = self.n_games
+        if n == 0:
+            return
+        point = self.convergence_point()
+        if self.convergence and self.convergence[-1][0] == n:
+            self.convergence[-1] = point
+        else:
+            self.convergence.append(point)
+        self._next_checkpoint = max(n + 1, int(n * CHECKPOINT_GROWTH))
+
+    def mean(self) -> float:
+        return self.score_sum / self.n_games if self.n_games else 0.0
+
+    def variance(self) -> float:
+        """
+        Population variance of the final scores
+        """
+        if self.n_games == 0:
+            return 0.0
+        mean = self.mean()
+        return max(self.score_sq_sum / self.n_games - mean * mean, 0.0)
+
+    def summary(self) -> dict:
+        """
+        Machine-readable summary of the recorded games
+        """
+        n = self.n_games
+        std = math.sqrt(self.variance())
+        return {
+            'games': n,
+            'mean': self.mean(),
+            'std': std,
+            'std_error': std / math.sqrt(n) if n else 0.0,
+            'min': self.min_score if n else None,
+            'max': self.max_score if n else None,
+            'avg_upper': self.upper_sum / n if n else 0.0,
+            'bonus_rate': self.bonus_count / n if n else 0.0,
+            'avg_chance': self.chance_sum / self.chance_count if self.chance_count else 0.0,
+            'yahtzee_rate': self.yahtzee_hits / n if n else 0.0,
+            'small_straight_rate': self.small_straight_hits / n if n else 0.0,
+            'large_straight_rate': self.large_straight_hits / n if n else 0.0,
+            'category_usage': dict(sorted(self.category_usage.items())),
+        }
+
     def report(self):
-        n = len(self.total_scores)
+        n = self.n_games
         if n == 0:
             print("No games played.")
             return
 
 
-        mean = sum(self.total_scores) / n
-        min_score = min(self.total_scores)
-        max_score = max(self.total_scores)
+        mean = self.mean()
+        min_score = self.min_score
+        max_score = self.max_score
 
-        variance = sum((x - mean) ** 2 for x in self.total_scores) / n
-        std = math.sqrt(variance)
+        std = math.sqrt(self.variance())
 
         bonus_rate = self.bonus_count / n
-        avg_upper = sum(self.upper_totals) / n
+        avg_upper = self.upper_sum / n
 
         avg_chance = (
-            sum(self.chance_scores) / len(self.chance_scores)
-            if self.chance_scores else 0
+            self.chance_sum / self.chance_count
+            if self.chance_count else 0
         )
 
 
@@ -113,4 +330,15 @@ class StatsCollector:
             print(f"Upper Total: {self.min_score_game_state.upper_total}")
             print(f"Upper Bonus: {self.min_score_game_state.upper_bonus}")
             print(f"TOTAL SCORE: {self.min_score_game_state.total_score}")
+            lowest = self.exemplars.lowest() if self.exemplars is not None else None
+            if lowest is not None and lowest.total_score == self.min_score and lowest.turns:
+                print("Turns:")
+                for line in lowest.describe():
+                    print(line)
+
+        top = self.exemplars.top() if self.exemplars is not None else []
+        if top:
+            print(f"\n--- Exemplars ({len(self.exemplars.sample())} sampled of {self.exemplars.games} games) ---")
+            print(f"Top scores: {[game.total_score for game in top]}")
+            print(f"Bottom scores: {[game.total_score for game in self.exemplars.bottom()]}")
 
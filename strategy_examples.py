@@ -4,8 +4,12 @@ strategy.py
 Strategies adapted for Dynamic GameRules.
 """
 import random
+from collections import Counter
 from game_state import GameState
-from dice_utils import get_longest_straight
+from dice_utils import get_longest_straight, keep_mask_from_indices
+from upper_bonus import get_upper_bonus_table
+from turn_solver import TurnSolver, get_turn_tables, hand_count, MAX_SOLVER_HANDS
+from category_tables import get_category_tables
 
 
 class Strategy():
@@ -13,6 +17,10 @@ class Strategy():
     Base class for all Yahtzee strategies. Defines the interface and shared helper methods.
     """
 
+    # Random source for strategies that randomize. Runners give each instance its own
+    # random.Random so threads never share one generator.
+    rng = random
+
     def choose_dice_to_keep(self, dice:list[int], roll_index: int, state:GameState) -> list[int]:
         """
         This method decide which dice indices to keep.
@@ -32,6 +40,13 @@ class Strategy():
         """
         raise NotImplementedError("Subclasses must implement this method")
 
+    def choose_keep_mask(self, dice: list[int], roll_index: int, state: GameState) -> int:
+        """
+        Same decision as choose_dice_to_keep, returned as a bitmask (bit i set = keep die i).
+        Strategies may override this directly to avoid building index lists.
+        """
+        return keep_mask_from_indices(self.choose_dice_to_keep(dice, roll_index, state), len(dice))
+
     def _get_upper_cat(self, face: int) -> str:
         """Helper to generate category name like 'upper_1', 'upper_6'"""
         return f"upper_{face}"
@@ -43,13 +58,13 @@ class RandomStrategy(Strategy):
         num_dice = len(dice)
         if num_dice == 0: return []
 
-        k = random.randint(0, num_dice)
-        indices = random.sample(range(num_dice), k)
+        k = self.rng.randint(0, num_dice)
+        indices = self.rng.sample(range(num_dice), k)
         return indices
 
     def choose_category(self, _dice: list[int], state: GameState) -> str:
         available = state.available_categories()
-        return random.choice(available)
+        return self.rng.choice(available)
 
 # GreedyStrategy: Keep the dice with most frequent value and put in the highest score category
 class GreedyStrategy(Strategy):
@@ -65,8 +80,9 @@ class GreedyStrategy(Strategy):
         best_cat = available[0]
         max_score = -1
 
+        scores = state.score_calc.score_all(dice, available, out=state.score_buffer)
         for cat in available:
-            score = state.score_calc.calculate(cat, dice)
+            score = scores[cat]
             if score > max_score:
                 max_score = score
                 best_cat = cat
@@ -75,11 +91,11 @@ class GreedyStrategy(Strategy):
 
 # SimpleRuleStrategy: follow simple pre-set rules to choose dice to keep and put score in category
 class SimpleRuleStrategy(Strategy):
-    def choose_dice_to_keep(self, dice: list[int], _roll_index: int, _state: GameState) -> list[int]:
+    def choose_dice_to_keep(self, dice: list[int], _roll_index: int, state: GameState) -> list[int]:
         # Check straight
         seq = get_longest_straight(dice)
 
-        if len(seq) >= 3:
+        if len(seq) >= state.rules.small_straight_length - 1:
             return [i for i, x in enumerate(dice) if x in seq]
 
         # Keep most frequent value
@@ -92,7 +108,8 @@ class SimpleRuleStrategy(Strategy):
         available = state.available_categories()
 
         # Calculate the scores for all available categories in advance
-        scores = {cat: state.score_calc.calculate(cat, dice) for cat in available}
+        scores = state.score_calc.score_all(dice, available, out=state.score_buffer)
+        rules = state.rules
 
         # Create a dist for categories' priority
         # Highest priority： special values
@@ -109,10 +126,10 @@ class SimpleRuleStrategy(Strategy):
         for cat in priority_list:
             if cat in available:
                 s = scores[cat]
-                if cat == 'yahtzee' and s < 50: continue
-                if cat == 'large_straight' and s < 40: continue
-                if cat == 'small_straight' and s < 30: continue
-                if cat == 'full_house' and s < 25: continue
+                if cat == 'yahtzee' and s < rules.yahtzee_score: continue
+                if cat == 'large_straight' and s < rules.large_straight_score: continue
+                if cat == 'small_straight' and s < rules.small_straight_score: continue
+                if cat == 'full_house' and s < rules.full_house_score: continue
 
                 # for other categories, fill in if it has score
                 if s > 0:
@@ -151,13 +168,14 @@ class HumanLikeStrategy(Strategy):
         consecutive_len = len(consecutive_seq)
 
         # Check for large straight
-        if consecutive_len >= 5:
+        if consecutive_len >= state.rules.large_straight_length:
             return list(range(len(dice)))
 
         # Try to make straight if there are straight categories available
-        if consecutive_len >= 4:
-            needs_small = 'small_straight' in state.available_categories()
-            needs_large = 'large_straight' in state.available_categories()
+        available = state.available_categories()
+        if consecutive_len >= state.rules.small_straight_length:
+            needs_small = 'small_straight' in available
+            needs_large = 'large_straight' in available
             if needs_small or needs_large:
                 return [i for i, x in enumerate(dice) if x in consecutive_seq]
 
@@ -167,7 +185,7 @@ class HumanLikeStrategy(Strategy):
         target_val = 0
         for val in potential_vals:
             cat = self._get_upper_cat(val)
-            if cat in state.available_categories():
+            if cat in available:
                 target_val = val
                 break
 
@@ -181,22 +199,23 @@ class HumanLikeStrategy(Strategy):
         # Backup strategy: Keep 1 of the largest numbers that correspond to the unoccupied positions in the upper section.
         for val in range(num_faces, 0, -1):
             cat = self._get_upper_cat(val)
-            if cat in state.available_categories() and val in dice:
+            if cat in available and val in dice:
                 return [i for i, x in enumerate(dice) if x == val][:1]
 
         return []
 
     def choose_category(self, dice: list[int], state: GameState) -> str:
         available = state.available_categories()
-        scores = {cat: state.score_calc.calculate(cat, dice) for cat in available}
+        scores = state.score_calc.score_all(dice, available, out=state.score_buffer)
         counts = Counter(dice)
 
-        num_faces = state.rules.num_faces
+        rules = state.rules
+        num_faces = rules.num_faces
 
 
-        total_slots = len(state.score_calc.get_all_categories()) * state.rules.max_category_fills
+        total_slots = state.total_slots
         # Calculate filled in times
-        filled_count = sum(len(s) for s in state.category_scores.values())
+        filled_count = state.filled_count
         remaining_slots = total_slots - filled_count
         # Set the rest 30% categories left as late game phase
         is_late_game = remaining_slots <= (total_slots * 0.3)
@@ -204,11 +223,13 @@ class HumanLikeStrategy(Strategy):
 
         # Rules for filling in the category
         # Get directly if satisfied
-        if 'yahtzee' in available and scores['yahtzee'] == 50: return 'yahtzee'
-        if 'large_straight' in available and scores['large_straight'] == 40: return 'large_straight'
-        if 'small_straight' in available and scores['small_straight'] == 30:
+        if 'yahtzee' in available and scores['yahtzee'] == rules.yahtzee_score: return 'yahtzee'
+        if 'large_straight' in available and scores['large_straight'] == rules.large_straight_score:
+            return 'large_straight'
+        if 'small_straight' in available and scores['small_straight'] == rules.small_straight_score:
             return 'small_straight'
-        if is_late_game and 'full_house' in available and scores['full_house'] == 25: return 'full_house'
+        if is_late_game and 'full_house' in available and scores['full_house'] == rules.full_house_score:
+            return 'full_house'
 
 
         # Go through upper section from large value
@@ -223,7 +244,7 @@ class HumanLikeStrategy(Strategy):
         # Set threshold for lower section categories
         if 'four_of_a_kind' in available and scores['four_of_a_kind'] >= sum(dice) * 0.7:
             return 'four_of_a_kind'
-        if 'full_house' in available and scores['full_house'] == 25: return 'full_house'
+        if 'full_house' in available and scores['full_house'] == rules.full_house_score: return 'full_house'
         if 'three_of_a_kind' in available and scores['three_of_a_kind'] >= sum(dice) * 0.6:
             return 'three_of_a_kind'
 
@@ -254,33 +275,27 @@ class HumanLikeStrategy(Strategy):
         return available[0]
 
 
-from collections import Counter
-from game_state import GameState
+class AdvancedHumanLikeStrategy(Strategy):
 
+    # Keep chasing the upper bonus while it is at least this likely
+    min_bonus_probability = 0.01
 
-class AdvancedHumanLikeStrategy(Strategy):
+    def __init__(self):
+        self._bonus_rules = None
+        self._bonus_table = None
 
     def _needs_upper_bonus(self, state: GameState) -> bool:
         """
         To check if is it still realistic to hit the bonus threshold.
-        Optimistic bound: assume we might still get 3 of each remaining face slot.
+        Looks up the precomputed probability of reaching it from the remaining upper slots.
         """
-        target = state.rules.upper_bonus_threshold
-        current_upper = state.upper_total
-
-        optimistic_future = 0
-        num_faces = state.rules.num_faces
-        max_fills = state.rules.max_category_fills
-
-        for face in range(1, num_faces + 1):
-            cat = self._get_upper_cat(face)
-            current_fills = len(state.category_scores.get(cat, []))
-            remaining_slots = max_fills - current_fills
+        table = self._bonus_table
+        if state.rules is not self._bonus_rules:
+            table = get_upper_bonus_table(state.rules)
+            self._bonus_rules, self._bonus_table = state.rules, table
 
-            if remaining_slots > 0:
-                optimistic_future += remaining_slots * (face * 3)
-
-        return (current_upper + optimistic_future) >= target
+        prob = table.probability(state.upper_slots_code, state.upper_total)
+        return prob >= self.min_bonus_probability
 
 
     def choose_dice_to_keep(self, dice: list[int], roll_index: int, state: GameState) -> list[int]:
@@ -317,7 +332,8 @@ class AdvancedHumanLikeStrategy(Strategy):
             max_seq = get_longest_straight(dice)
 
             # If have 4+ in a run or sufficient for small straight
-            if len(max_seq) >= 4:
+            straight_len = state.rules.small_straight_length
+            if len(max_seq) >= straight_len:
                 # check conditions for strong Upper Section Triple override
                 if count >= 3 and most_common_value > (num_faces / 2):
                     cat_name = self._get_upper_cat(most_common_value)
@@ -328,7 +344,7 @@ class AdvancedHumanLikeStrategy(Strategy):
                 return [i for i, x in enumerate(dice) if x in max_seq]
 
             # If we have only 3 in sequence like 2,3,4 -> only worth keeping on the first reroll
-            if len(max_seq) == 3 and roll_index == 0:
+            if len(max_seq) == straight_len - 1 and roll_index == 0:
                 return [i for i, x in enumerate(dice) if x in max_seq]
 
         # Fourth priority: Triples
@@ -356,12 +372,13 @@ class AdvancedHumanLikeStrategy(Strategy):
 
     def choose_category(self, dice: list[int], state: GameState) -> str:
         available = state.available_categories()
-        scores = {cat: state.score_calc.calculate(cat, dice) for cat in available}
+        scores = state.score_calc.score_all(dice, available, out=state.score_buffer)
         upper_needed = self._needs_upper_bonus(state)
-        num_faces = state.rules.num_faces
+        rules = state.rules
+        num_faces = rules.num_faces
 
         # Take Yahtzee if hit it
-        if 'yahtzee' in available and scores.get('yahtzee', 0) == 50:
+        if 'yahtzee' in available and scores.get('yahtzee', 0) == rules.yahtzee_score:
             return 'yahtzee'
 
         # Take large straight if hit it
@@ -369,7 +386,7 @@ class AdvancedHumanLikeStrategy(Strategy):
             return 'large_straight'
 
         # Take small straight if hit it
-        if 'small_straight' in available and scores.get('small_straight', 0) == 30:
+        if 'small_straight' in available and scores.get('small_straight', 0) == rules.small_straight_score:
             return 'small_straight'
 
         # Upper section priority
@@ -384,7 +401,7 @@ class AdvancedHumanLikeStrategy(Strategy):
                     return cat
 
         # Take Full house if hit it
-        if 'full_house' in available and scores.get('full_house', 0) == 25:
+        if 'full_house' in available and scores.get('full_house', 0) == rules.full_house_score:
             return 'full_house'
 
         # 4-of-a-kind, 3-of-a-kind, Chance
@@ -397,8 +414,8 @@ class AdvancedHumanLikeStrategy(Strategy):
 
         # Dump Logic
         # Calculate game progress
-        total_slots = len(state.score_calc.get_all_categories()) * state.rules.max_category_fills
-        filled_count = sum(len(s) for s in state.category_scores.values())
+        total_slots = state.total_slots
+        filled_count = state.filled_count
         # Early game definition: < 40% filled is early
         is_early_game = filled_count < (total_slots * 0.4)
 
@@ -418,4 +435,133 @@ class AdvancedHumanLikeStrategy(Strategy):
             if cat in available:
                 return cat
 
-        return available[0]
\ No newline at end of file
+        return available[0]
+
+
+class ExpectimaxStrategy(Strategy):
+    """
+    Looks ahead over the current turn with exact expectimax (turn_solver.TurnSolver).
+
+    A finished hand is worth its best category score minus that category's par (its expected
+    score when a later turn chases it), plus the change in upper bonus probability times the
+    bonus reward. Turn values are kept in a transposition table per state signature, so
+    states reached again (every opening turn, common early states) cost only lookups.
+    Rules with too many distinct hands for exact solving use the fallback strategy.
+    """
+
+    # Weight of the par (future value) of a category against its score now
+    par_weight = 1.0
+    # Drop the transposition tables once this many state signatures are cached
+    max_cached_states = 2000
+
+    def __init__(self, depth: int | None = None, max_nodes: int | None = None,
+                 max_seconds: float | None = None, fallback: Strategy | None = None):
+        """
+        :param depth: rerolls searched ahead of each keep decision (default: all)
+        :param max_nodes: chance nodes expanded per keep decision (default: unlimited)
+        :param max_seconds: time spent per keep decision (default: unlimited)
+        :param fallback: strategy for rules too large to solve (default: AdvancedHumanLikeStrategy)
+        """
+        self.depth = depth
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.fallback = fallback if fallback is not None else AdvancedHumanLikeStrategy()
+
+        self._rules = None
+        self._tables = None
+        self._pars = None
+        self._bonus_table = None
+        # state signature -> (TurnSolver, category values function)
+        self._solvers: dict[tuple, tuple] = {}
+        # the state only changes between turns, so its solver is looked up once per turn
+        self._state = None
+        self._filled = -1
+        self._current = None
+
+    def _set_rules(self, rules) -> None:
+        self._rules = rules
+        self._solvers.clear()
+        self._tables = None
+        if hand_count(rules) <= MAX_SOLVER_HANDS:
+            self._tables = get_turn_tables(rules)
+            category_tables = get_category_tables(rules)
+            self._pars = {cat: category_tables.expected(cat) for cat in category_tables.categories}
+            self._bonus_table = get_upper_bonus_table(rules)
+
+    def _category_values(self, state: GameState):
+        """
+        Function(sorted hand) -> {available category: value of filling it now}
+        """
+        rules = state.rules
+        tables = self._tables
+        bonus = self._bonus_table
+        reward = rules.upper_bonus_reward
+        code = state.upper_slots_code
+        upper_total = state.upper_total
+        bonus_now = bonus.probability(code, upper_total)
+
+        # category -> (par, slot code after filling it, or None for lower categories)
+        options = {}
+        for cat in state.available_categories():
+            face = state.score_calc.upper_faces.get(cat)
+            after = code - state.slot_base ** (face - 1) if face is not None else None
+            options[cat] = (self.par_weight * self._pars[cat], after)
+
+        def values(hand):
+            scores = tables.scores(hand)
+            result = {}
+            for cat, (par, after) in options.items():
+                value = scores[cat] - par
+                if after is not None:
+                    value += reward * (bonus.probability(after, upper_total + scores[cat]) - bonus_now)
+                result[cat] = value
+            return result
+
+        return values
+
+    def _solver(self, state: GameState):
+        if state is self._state and state.filled_count == self._filled:
+            return self._current
+
+        if state.rules is not self._rules:
+            self._set_rules(state.rules)
+        current = None
+        if self._tables is not None:
+            sig = (tuple(state.fill_counts.values()),
+                   min(state.upper_total, state.rules.upper_bonus_threshold))
+            current = self._solvers.get(sig)
+            if current is None:
+                if len(self._solvers) >= self.max_cached_states:
+                    self._solvers.clear()
+                values = self._category_values(state)
+                solver = TurnSolver(self._tables, lambda hand: max(values(hand).values()), depth=self.depth,
+                                    max_nodes=self.max_nodes, max_seconds=self.max_seconds)
+                current = (solver, values)
+                self._solvers[sig] = current
+
+        self._state, self._filled, self._current = state, state.filled_count, current
+        return current
+
+    def choose_dice_to_keep(self, dice: list[int], roll_index: int, state: GameState) -> list[int]:
+        current = self._solver(state)
+        if current is None:
+            return self.fallback.choose_dice_to_keep(dice, roll_index, state)
+
+        hand = tuple(sorted(dice))
+        keep, _ = current[0].best_keep(hand, state.rules.max_rerolls - roll_index)
+        # map the kept multiset back to dice positions
+        remaining = Counter(keep)
+        indices = []
+        for i, value in enumerate(dice):
+            if remaining[value] > 0:
+                remaining[value] -= 1
+                indices.append(i)
+        return indices
+
+    def choose_category(self, dice: list[int], state: GameState) -> str:
+        current = self._solver(state)
+        if current is None:
+            return self.fallback.choose_category(dice, state)
+
+        values = current[1](tuple(sorted(dice)))
+        return max(values, key=values.get)
@@ -1,11 +1,20 @@
-import matplotlib.pyplot as plt
-import numpy as np
 from strategy_examples import RandomStrategy, GreedyStrategy, SimpleRuleStrategy, HumanLikeStrategy, AdvancedHumanLikeStrategy
 from simulator import Simulator
 from game_rules import GameRules
 
 
-def run_simulation(rules: GameRules, num_games: int = 2000):
+def run_simulation(rules: GameRules, num_games: int = 2000, live: bool = False, batch: int = 1000):
+    """
+    Simulate every strategy and plot running averages with 95% confidence bands
+    and the final score distributions.
+    :param rules: GameRules object
+    :param num_games: games per strategy
+    :param live: redraw the figure after every batch while the simulation runs
+    :param batch: games per strategy between redraws when live
+    """
+    # plotting libraries are heavy, load them only when a plot is made
+    import matplotlib.pyplot as plt
+    from stream_plots import draw_comparison, live_comparison
 
     print(f"Current Game Rule: {rules}")
 
@@ -18,44 +27,28 @@ def run_simulation(rules: GameRules, num_games: int = 2000):
         'AdvancedHumanLike': AdvancedHumanLikeStrategy()
     }
 
-    results = {}
-
     # Simulation
     print(f"start simulation for {num_games} games")
 
+    if live:
+        live_comparison(rules, strategies, num_games, batch=batch)
+        plt.show()
+        return
+
+    results = {}
     for name, strat in strategies.items():
         print(f"  Current strategy {name}...")
 
-        # Initialize the simulator
+        # Initialize the simulator, only streaming aggregates are needed for the plots
         sim = Simulator(rules)
+        sim.stats.keep_scores = False
 
         # Run simulation
         sim.simulate_many(strat, n=num_games)
 
-        # Record all scores for visualization
-        results[name] = sim.stats.total_scores
-
-    # Create the plot
-    plt.figure(figsize=(12, 7))
-
-    for name, scores in results.items():
-        cumsum = np.cumsum(scores)
-        running_avg = cumsum / (np.arange(len(scores)) + 1)
-
-        plt.plot(running_avg, label=f"{name} (Final Avg: {running_avg[-1]:.1f})", linewidth=2)
-
-    plt.xlabel("Number of Games Played", fontsize=12)
-    plt.ylabel("Average Score", fontsize=12)
-
-    title_str = (f"Yahtzee Strategy Comparison\n"
-                 f"Rules: {rules.num_dice} Dice, {rules.num_faces} Faces, "
-                 f"{rules.max_category_fills}x Fill(s), {rules.max_rerolls} Reroll time(s)")
-    plt.title(title_str, fontsize=12, fontweight='bold')
-
-    plt.legend(fontsize=10, loc='upper right', frameon=0.5)
-    plt.grid(True, linestyle='--', alpha=0.6)
+        results[name] = sim.stats
 
-    plt.tight_layout()
+    draw_comparison(results, rules)
     plt.show()
 
 
@@ -0,0 +1,147 @@
+"""
+stream_plots.py
+
+Plots rendered from streaming StatsCollector aggregates instead of per-game score lists:
+- convergence curves of the running mean with confidence bands, from the downsampled
+  checkpoints in StatsCollector.convergence
+- score distributions, from StatsCollector.score_histogram
+
+Memory and drawing cost stay the same at 10^3 or 10^8 games. live_comparison redraws
+the figure between batches while a long simulation is running.
+"""
+from __future__ import annotations
+from game_rules import GameRules
+from simulator import Simulator
+
+
+def convergence_points(stats) -> list[tuple[int, float, float]]:
+    """
+    Convergence checkpoints of a collector, always ending at its current game count
+    """
+    points = list(stats.convergence)
+    if stats.n_games and (not points or points[-1][0] != stats.n_games):
+        points.append(stats.convergence_point())
+    return points
+
+
+def plot_convergence(stats_by_name: dict, ax=None, z: float = 1.96, log_x: bool = False):
+    """
+    Running average score per strategy with a +-z standard error band
+    :param stats_by_name: strategy name -> StatsCollector
+    :param ax: matplotlib axes (default: current axes)
+    :param z: band half-width in standard errors (1.96 = 95%)
+    :param log_x: use a log scale for the game count
+    """
+    import matplotlib.pyplot as plt
+
+    ax = ax if ax is not None else plt.gca()
+    for name, stats in stats_by_name.items():
+        points = convergence_points(stats)
+        if not points:
+            continue
+        games = [p[0] for p in points]
+        means = [p[1] for p in points]
+        low = [p[1] - z * p[2] for p in points]
+        high = [p[1] + z * p[2] for p in points]
+
+        line, = ax.plot(games, means, linewidth=2,
+                        label=f"{name} (Final Avg: {means[-1]:.1f} ± {z * points[-1][2]:.1f})")
+        ax.fill_between(games, low, high, color=line.get_color(), alpha=0.2)
+
+    if log_x:
+        ax.set_xscale('log')
+    ax.set_xlabel("Number of Games Played", fontsize=12)
+    ax.set_ylabel("Average Score", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend(fontsize=10, loc='upper right')
+    return ax
+
+
+def plot_distribution(stats_by_name: dict, ax=None, bin_width: int = 5):
+    """
+    Final score distribution per strategy, from the score histograms
+    :param stats_by_name: strategy name -> StatsCollector
+    :param ax: matplotlib axes (default: current axes)
+    :param bin_width: points per bin
+    """
+    import matplotlib.pyplot as plt
+
+    ax = ax if ax is not None else plt.gca()
+    for name, stats in stats_by_name.items():
+        if not stats.n_games:
+            continue
+        bins: dict[int, int] = {}
+        for score, count in stats.score_histogram.items():
+            b = score // bin_width * bin_width
+            bins[b] = bins.get(b, 0) + count
+        edges = sorted(bins)
+        share = [bins[b] / stats.n_games for b in edges]
+        ax.step(edges, share, where='post', linewidth=1.5, label=name)
+
+    ax.set_xlabel("Final Score", fontsize=12)
+    ax.set_ylabel(f"Share of Games (per {bin_width} points)", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend(fontsize=10, loc='upper right')
+    return ax
+
+
+def draw_comparison(stats_by_name: dict, rules: GameRules, fig=None):
+    """
+    Convergence curves and score distributions side by side
+    """
+    import matplotlib.pyplot as plt
+
+    if fig is None:
+        fig = plt.figure(figsize=(15, 6))
+    fig.clf()
+    ax_conv, ax_dist = fig.subplots(1, 2)
+    plot_convergence(stats_by_name, ax=ax_conv)
+    plot_distribution(stats_by_name, ax=ax_dist)
+    fig.suptitle(f"Yahtzee Strategy Comparison\n"
+                 f"Rules: {rules.num_dice} Dice, {rules.num_faces} Faces, "
+                 f"{rules.max_category_fills}x Fill(s), {rules.max_rerolls} Reroll time(s)",
+                 fontsize=12, fontweight='bold')
+    fig.tight_layout()
+    return fig
+
+
+def live_comparison(rules: GameRules, strategies: dict, num_games: int, batch: int = 1000,
+                    on_batch=None) -> dict:
+    """
+    Simulate every strategy in batches and redraw the comparison after each batch
+    :param rules: GameRules object
+    :param strategies: name -> strategy instance
+    :param num_games: games per strategy
+    :param batch: games per strategy between redraws
+    :param on_batch: optional callback(stats_by_name) after each batch instead of redrawing
+    :return: name -> StatsCollector
+    """
+    sims = {}
+    for name in strategies:
+        sim = Simulator(rules)
+        sim.stats.keep_scores = False
+        sims[name] = sim
+    stats_by_name = {name: sim.stats for name, sim in sims.items()}
+
+    fig = None
+    if on_batch is None:
+        import matplotlib.pyplot as plt
+        plt.ion()
+        fig = plt.figure(figsize=(15, 6))
+
+    done = 0
+    while done < num_games:
+        n = min(batch, num_games - done)
+        for name, strategy in strategies.items():
+            sims[name].simulate_many(strategy, n=n)
+        done += n
+
+        if on_batch is not None:
+            on_batch(stats_by_name)
+        else:
+            draw_comparison(stats_by_name, rules, fig=fig)
+            plt.pause(0.01)
+
+    if fig is not None:
+        plt.ioff()
+    return stats_by_name
@@ -1,11 +1,6 @@
 from game_rules import GameRules
 from simulator import Simulator
-from strategy_examples import *
-
-"""
-Before start the simulation, uncomment the self.stats.report() in simulate_many() in the simulator.py
-so that it will show the stats result.
-"""
+from strategy_examples import HumanLikeStrategy
 
 # Set rules
 rules = GameRules(num_dice=5, num_faces=6, max_category_fills=1, upper_bonus_reward=35, max_rerolls=2)
@@ -15,3 +10,6 @@ sim = Simulator(rules)
 # Choose strategy
 strategy = HumanLikeStrategy()
 avg_score = sim.simulate_many(strategy, n=5000)
+
+# Show the stats result
+sim.stats.report()
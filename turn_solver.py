@@ -0,0 +1,270 @@
+"""
+turn_solver.py
+
+Exact expectimax over the rerolls of one turn.
+
+Hands and kept dice are sorted tuples. Chance nodes enumerate every reroll result with its
+exact multinomial probability (dice_utils.reroll_outcomes), and decision nodes try every
+distinct subset of the hand to keep. A hand with no rerolls left is worth leaf(hand); the
+leaf is supplied by the caller (e.g. best category score adjusted for the rest of the game).
+
+Values are memoized in a transposition table keyed on (hand, rerolls left). A solver is
+built for one leaf function, so callers keep one solver per game-state signature, which
+gives the (sorted hand, rerolls left, state signature) key.
+
+Per-decision budgets: depth limits how many rerolls ahead are searched, max_nodes and
+max_seconds cap the chance nodes expanded. Hands beyond a budget are valued as if the
+turn stopped there (their leaf value); such values are only kept for the current decision,
+never in the transposition table.
+"""
+from __future__ import annotations
+import threading
+import time
+from itertools import product
+from math import comb
+from dice_utils import reroll_outcomes
+from game_rules import GameRules
+from score_calculator import ScoreCalculator
+from upper_bonus import rules_key
+
+
+# Exact solving is only offered when a turn has at most this many distinct hands
+MAX_SOLVER_HANDS = 5000
+
+
+def hand_count(rules: GameRules) -> int:
+    """
+    Number of distinct sorted hands
+
+    >>> hand_count(GameRules())
+    252
+    """
+    return comb(rules.num_dice + rules.num_faces - 1, rules.num_dice)
+
+
+class TurnTables:
+    """
+    Dice transitions and hand scores of one rule set, shared by every solver
+    """
+
+    def __init__(self, rules: GameRules):
+        self.rules = rules
+        self.num_dice = rules.num_dice
+        self.max_rerolls = rules.max_rerolls
+        self.score_calc = ScoreCalculator(rules)
+        # rolls[j]: every result of rolling j dice
+        self.rolls = [reroll_outcomes(j, rules.num_faces) for j in range(rules.num_dice + 1)]
+        self._outcomes: dict[tuple, list[tuple[tuple[int, ...], float]]] = {}
+        self._sub_keeps: dict[tuple, list[tuple[int, ...]]] = {}
+        self._scores: dict[tuple, dict[str, int]] = {}
+
+    def outcomes(self, keep: tuple[int, ...]) -> list[tuple[tuple[int, ...], float]]:
+        """
+        Hands reachable by keeping `keep` and rerolling the other dice, with their probabilities
+        """
+        result = self._outcomes.get(keep)
+        if result is None:
+            result = [(tuple(sorted(keep + rolled)), p) for rolled, p in self.rolls[self.num_dice - len(keep)]]
+            self._outcomes[keep] = result
+        return result
+
+    def sub_keeps(self, hand: tuple[int, ...]) -> list[tuple[int, ...]]:
+        """
+        Every distinct multiset of dice that can be kept from a sorted hand
+
+        >>> TurnTables(GameRules(num_dice=3)).sub_keeps((2, 2, 5))
+        [(), (5,), (2,), (2, 5), (2, 2), (2, 2, 5)]
+        """
+        result = self._sub_keeps.get(hand)
+        if result is None:
+            faces = sorted(set(hand))
+            counts = [hand.count(f) for f in faces]
+            result = []
+            for taken in product(*(range(c + 1) for c in counts)):
+                keep = []
+                for face, k in zip(faces, taken):
+                    keep.extend([face] * k)
+                result.append(tuple(keep))
+            self._sub_keeps[hand] = result
+        return result
+
+    def scores(self, hand: tuple[int, ...]) -> dict[str, int]:
+        """
+        Score of every category for a hand
+        """
+        result = self._scores.get(hand)
+        if result is None:
+            result = self.score_calc.score_all(list(hand))
+            self._scores[hand] = result
+        return result
+
+
+_TABLES: dict[tuple, TurnTables] = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def get_turn_tables(rules: GameRules) -> TurnTables:
+    """
+    Return the shared tables for these rules, building them on first request
+    """
+    if hand_count(rules) > MAX_SOLVER_HANDS:
+        raise ValueError(f'{hand_count(rules)} distinct hands, exact turn solving supports at most {MAX_SOLVER_HANDS}')
+    key = rules_key(rules)
+    tables = _TABLES.get(key)
+    if tables is None:
+        with _TABLES_LOCK:
+            tables = _TABLES.get(key)
+            if tables is None:
+                tables = TurnTables(rules)
+                _TABLES[key] = tables
+    return tables
+
+
+class TurnSolver:
+    """
+    Expectimax values of one turn for a fixed leaf function
+    """
+
+    def __init__(self, tables: TurnTables, leaf, depth: int | None = None, max_nodes: int | None = None,
+                 max_seconds: float | None = None):
+        """
+        :param tables: TurnTables of the rules
+        :param leaf: function(sorted hand) -> value of ending the turn with that hand
+        :param depth: rerolls searched ahead of each decision (default: all)
+        :param max_nodes: chance nodes expanded per decision (default: unlimited)
+        :param max_seconds: time spent per decision (default: unlimited)
+        """
+        self.tables = tables
+        self.leaf = leaf
+        self.depth = depth
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+
+        # transposition tables: (hand, rerolls) -> value, (kept dice, rerolls) -> expected value
+        self._values: dict[tuple, float] = {}
+        self._keep_values: dict[tuple, float] = {}
+        self._leaf_values: dict[tuple, float] = {}
+        # values that depend on a budget cutoff, valid for the current decision only
+        self._scratch: dict[tuple, float] = {}
+        self._cutoffs = 0
+
+        self.nodes = 0
+        self._min_rerolls = 0
+        self._deadline = None
+
+    def leaf_value(self, hand: tuple[int, ...]) -> float:
+        value = self._leaf_values.get(hand)
+        if value is None:
+            value = self.leaf(hand)
+            self._leaf_values[hand] = value
+        return value
+
+    def _start_decision(self, rerolls: int) -> None:
+        self._scratch.clear()
+        self.nodes = 0
+        self._min_rerolls = rerolls - self.depth if self.depth is not None else 0
+        self._deadline = time.perf_counter() + self.max_seconds if self.max_seconds is not None else None
+
+    def _out_of_budget(self, rerolls: int) -> bool:
+        if rerolls <= self._min_rerolls:
+            return True
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self._deadline is not None and time.perf_counter() > self._deadline
+
+    def _store(self, table: dict, key: tuple, value: float, cutoffs: int) -> None:
+        if self._cutoffs == cutoffs:
+            table[key] = value
+        else:
+            self._scratch[key] = value
+
+    def hand_value(self, hand: tuple[int, ...], rerolls: int) -> float:
+        """
+        Expected leaf value of a hand with `rerolls` rerolls left, under the best keeps
+        """
+        if rerolls == 0:
+            return self.leaf_value(hand)
+        key = (hand, rerolls)
+        value = self._values.get(key)
+        if value is not None:
+            return value
+        value = self._scratch.get(key)
+        if value is not None:
+            # a cut-off value, so is anything computed from it
+            self._cutoffs += 1
+            return value
+        if self._out_of_budget(rerolls):
+            self._cutoffs += 1
+            return self.leaf_value(hand)
+
+        cutoffs = self._cutoffs
+        value = float('-inf')
+        for keep in self.tables.sub_keeps(hand):
+            keep_value = self.keep_value(keep, rerolls)
+            if keep_value > value:
+                value = keep_value
+        self._store(self._values, key, value, cutoffs)
+        return value
+
+    def keep_value(self, keep: tuple[int, ...], rerolls: int) -> float:
+        """
+        Expected value of keeping `keep` and rerolling the other dice (chance node)
+        """
+        key = (keep, rerolls)
+        value = self._keep_values.get(key)
+        if value is not None:
+            return value
+        value = self._scratch.get(key)
+        if value is not None:
+            self._cutoffs += 1
+            return value
+
+        self.nodes += 1
+        cutoffs = self._cutoffs
+        value = 0.0
+        if rerolls == 1:
+            # last reroll: read the leaf values directly
+            leaf_values = self._leaf_values
+            for hand, p in self.tables.outcomes(keep):
+                leaf_value = leaf_values.get(hand)
+                if leaf_value is None:
+                    leaf_value = self.leaf_value(hand)
+                value += p * leaf_value
+        else:
+            for hand, p in self.tables.outcomes(keep):
+                value += p * self.hand_value(hand, rerolls - 1)
+        self._store(self._keep_values, key, value, cutoffs)
+        return value
+
+    def best_keep(self, hand: tuple[int, ...], rerolls: int) -> tuple[tuple[int, ...], float]:
+        """
+        Decision node: the dice to keep from a sorted hand with `rerolls` rerolls left
+        :return: (kept dice, expected value)
+
+        Values cut off by a budget never reach the transposition tables, so a later
+        unbudgeted query gives the exact answer:
+
+        >>> tables = get_turn_tables(GameRules(num_dice=3, max_rerolls=3))
+        >>> leaf = lambda hand: max(tables.scores(hand).values())
+        >>> solver = TurnSolver(tables, leaf, depth=2)
+        >>> _ = solver.best_keep((2, 5, 6), 3)
+        >>> solver.depth = None
+        >>> solver.best_keep((2, 5, 6), 3) == TurnSolver(tables, leaf).best_keep((2, 5, 6), 3)
+        True
+        """
+        self._start_decision(rerolls)
+        best, best_value = hand, float('-inf')
+        for keep in self.tables.sub_keeps(hand):
+            value = self.keep_value(keep, rerolls)
+            if value > best_value:
+                best, best_value = keep, value
+        return best, best_value
+
+    def turn_value(self, rerolls: int | None = None) -> float:
+        """
+        Expected value of a whole turn: opening roll of every die, then `rerolls` rerolls
+        (default: the rules' max_rerolls)
+        """
+        rerolls = self.tables.max_rerolls if rerolls is None else rerolls
+        self._start_decision(rerolls)
+        return sum(p * self.hand_value(hand, rerolls) for hand, p in self.tables.rolls[self.tables.num_dice])
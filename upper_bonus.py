@@ -0,0 +1,185 @@
+"""
+upper_bonus.py
+
+Precomputed upper section bonus feasibility table.
+
+The table answers "how likely is it to still reach the upper bonus threshold"
+for every (remaining upper slots, current upper total) pair.
+Remaining upper slots are encoded as a single integer (slot code): digit f-1 in base
+(max_category_fills + 1) holds how many fills are left for upper_f.
+With one fill per category the slot code is simply the bitmask of open upper categories.
+
+Reasonable play model: every remaining upper slot is filled after one turn spent chasing
+that face (keep every die showing the face, reroll the rest on each reroll).
+"""
+from __future__ import annotations
+import threading
+from dataclasses import astuple
+from math import comb
+from game_rules import GameRules
+
+
+# Build every row up front when the table has at most this many slot codes,
+# larger rule sets fill rows on first use instead
+MAX_EAGER_CODES = 1 << 14
+# Lazily filled tables drop their rows once they hold this many, keeping memory bounded
+MAX_CACHED_CODES = 1 << 15
+
+
+def face_count_distribution(num_dice: int, num_faces: int, max_rerolls: int) -> list[float]:
+    """
+    Distribution of how many dice show a chosen face at the end of a turn
+    when the player keeps that face and rerolls everything else.
+
+    :param num_dice: number of dice
+    :param num_faces: number of faces on each die
+    :param max_rerolls: number of rerolls per turn
+    :return: probs[k] is the probability of ending the turn with k dice on the face
+
+    >>> [round(p, 4) for p in face_count_distribution(1, 6, 0)]
+    [0.8333, 0.1667]
+    >>> [round(p, 4) for p in face_count_distribution(2, 2, 1)]
+    [0.0625, 0.375, 0.5625]
+    """
+    # each die independently ends on the face unless it misses on every roll
+    p = 1 - (1 - 1 / num_faces) ** (max_rerolls + 1)
+    return [comb(num_dice, k) * p ** k * (1 - p) ** (num_dice - k) for k in range(num_dice + 1)]
+
+
+def rules_key(rules: GameRules) -> tuple:
+    """
+    Hashable key of every rule field, used to cache per-rules tables. Every field is included
+    (not only the dice and bonus fields), so tables that depend on scoring fields such as the
+    straight lengths are never shared between rule sets that differ in them.
+
+    >>> rules_key(GameRules()) == rules_key(GameRules())
+    True
+    >>> rules_key(GameRules()) == rules_key(GameRules(small_straight_length=3))
+    False
+    """
+    return astuple(rules)
+
+
+class UpperBonusTable:
+    """
+    P(reach upper_bonus_threshold) for every (slot code, upper total) pair
+    """
+
+    def __init__(self, rules: GameRules):
+        self.rules = rules
+        self.threshold = rules.upper_bonus_threshold
+        self.base = rules.max_category_fills + 1
+        self.num_faces = rules.num_faces
+        self.full_code = self.base ** self.num_faces - 1
+        self.count_probs = face_count_distribution(rules.num_dice, rules.num_faces, rules.max_rerolls)
+
+        # _dists[code][s]: probability the remaining slots add s points (s capped at threshold)
+        # _rows[code][need]: probability the remaining slots add at least `need` points
+        self._dists: dict[int, list[float]] = {}
+        self._rows: dict[int, list[float]] = {}
+        # lazily filled tables are shared by threads, rows are built and the cache dropped under this lock
+        self._lock = threading.Lock()
+        self._reset_cache()
+
+        self.eager = self.full_code + 1 <= MAX_EAGER_CODES
+        if self.eager:
+            for code in range(self.full_code + 1):
+                self._row(code)
+
+    def _reset_cache(self):
+        self._dists = {0: [1.0] + [0.0] * self.threshold}
+        self._rows = {0: [1.0] + [0.0] * self.threshold}
+
+    def slot_code(self, remaining_fills: list[int]) -> int:
+        """
+        Encode remaining fills per face (index 0 is upper_1) into a slot code
+
+        >>> table = UpperBonusTable(GameRules())
+        >>> table.slot_code([1, 0, 0, 0, 0, 1])
+        33
+        """
+        code = 0
+        for remaining in reversed(remaining_fills):
+            code = code * self.base + remaining
+        return code
+
+    def _dist(self, code: int) -> list[float]:
+        dist = self._dists.get(code)
+        if dist is not None:
+            return dist
+
+        # peel off the highest face that still has a slot left
+        face = self.num_faces
+        place = self.base ** (face - 1)
+        while code // place % self.base == 0:
+            face -= 1
+            place //= self.base
+
+        rest = self._dist(code - place)
+        cap = self.threshold
+        dist = [0.0] * (cap + 1)
+        for s, p_rest in enumerate(rest):
+            if p_rest == 0.0:
+                continue
+            for k, p_k in enumerate(self.count_probs):
+                dist[min(s + face * k, cap)] += p_rest * p_k
+
+        self._dists[code] = dist
+        return dist
+
+    def _row(self, code: int) -> list[float]:
+        row = self._rows.get(code)
+        if row is not None:
+            return row
+
+        with self._lock:
+            row = self._rows.get(code)
+            if row is not None:
+                return row
+
+            if not self.eager and len(self._rows) >= MAX_CACHED_CODES:
+                self._reset_cache()
+
+            dist = self._dist(code)
+            row = [0.0] * (self.threshold + 1)
+            tail = 0.0
+            for need in range(self.threshold, -1, -1):
+                tail += dist[need]
+                row[need] = min(tail, 1.0)
+
+            self._rows[code] = row
+            return row
+
+    def probability(self, code: int, upper_total: int) -> float:
+        """
+        Probability of reaching the bonus threshold from the given slots and upper total
+
+        >>> table = UpperBonusTable(GameRules())
+        >>> table.probability(0, 63), table.probability(0, 62)
+        (1.0, 0.0)
+        >>> table.probability(table.full_code, 0) < table.probability(table.full_code, 30)
+        True
+        """
+        need = self.threshold - upper_total
+        if need <= 0:
+            return 1.0
+        return self._row(code)[need]
+
+
+_TABLES: dict[tuple, UpperBonusTable] = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def get_upper_bonus_table(rules: GameRules) -> UpperBonusTable:
+    """
+    Return the shared table for these rules, building it on first request
+    """
+    key = rules_key(rules)
+    table = _TABLES.get(key)
+    if table is None:
+        with _TABLES_LOCK:
+            table = _TABLES.get(key)
+            if table is None:
+                table = UpperBonusTable(rules)
+                _TABLES[key] = table
+    return table